@@ -1,10 +1,13 @@
 """Prometheus metrics middleware."""
 import time
 import logging
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.core.cgroup import available_cores, cpu_throttling
+
 logger = logging.getLogger(__name__)
 
 # Define metrics
@@ -29,6 +32,13 @@ INFERENCE_LATENCY = Histogram(
 TOKENS_PER_SECOND = Gauge(
     "tokens_per_second",
     "Token generation rate",
+    ["model"],
+)
+
+GENERATED_TOKENS = Counter(
+    "generated_tokens_total",
+    "Total generated tokens",
+    ["model"],
 )
 
 ACTIVE_REQUESTS = Gauge(
@@ -39,9 +49,115 @@ ACTIVE_REQUESTS = Gauge(
 MODEL_MEMORY_BYTES = Gauge(
     "model_memory_bytes",
     "Estimated model memory usage",
+    ["model"],
+)
+
+KV_CACHE_BYTES = Gauge(
+    "kv_cache_bytes",
+    "Estimated KV cache memory per slot pool",
+    ["model", "pool"],
+)
+
+MODEL_LOADED = Gauge(
+    "model_loaded",
+    "Whether the model is currently loaded (1) or not (0)",
+    ["model"],
+)
+
+MODEL_LOAD_LATENCY = Histogram(
+    "model_load_latency_seconds",
+    "Time spent loading a model",
+    ["model"],
+    buckets=(1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+
+MODEL_EVICTIONS = Counter(
+    "model_evictions_total",
+    "Models unloaded to stay under the memory budget",
+    ["model"],
+)
+
+MODEL_ACTIVE_REQUESTS = Gauge(
+    "model_active_requests",
+    "Number of in-flight requests per model",
+    ["model"],
+)
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "time_to_first_token_seconds",
+    "Time from request start to first generated token",
+    ["model", "prompt_class", "long_prefill_running"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+PREFILL_QUEUE_DEPTH = Gauge(
+    "prefill_queue_depth",
+    "Prefill chunks waiting for the step token budget",
+)
+
+LONG_PREFILLS_IN_PROGRESS = Gauge(
+    "long_prefills_in_progress",
+    "Long prompts currently being prefilled",
+)
+
+STRUCTURED_OUTPUTS = Counter(
+    "structured_outputs_total",
+    "JSON-mode candidates by whether their text parsed as JSON",
+    ["model", "result"],
+)
+
+GRAMMAR_CACHE_REQUESTS = Counter(
+    "grammar_cache_requests_total",
+    "Response schema grammar lookups",
+    ["result"],
+)
+
+GRAMMAR_COMPILE_LATENCY = Histogram(
+    "grammar_compile_latency_seconds",
+    "Time to compile a response schema into a grammar",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+DRAINING = Gauge(
+    "draining",
+    "Whether the server is draining (1) and no longer admits new work",
+)
+
+DRAIN_IN_FLIGHT_REQUESTS = Gauge(
+    "drain_in_flight_requests",
+    "In-flight requests left to finish while draining",
+)
+
+DRAIN_CANCELLED_REQUESTS = Counter(
+    "drain_cancelled_requests_total",
+    "In-flight requests cancelled at the drain deadline",
+)
+
+LLAMA_THREADS = Gauge(
+    "llama_threads",
+    "llama.cpp threads per running sequence",
+    ["phase"],
+)
+
+CPU_BUDGET_SEQUENCES = Gauge(
+    "cpu_budget_sequences",
+    "Sequences currently sharing the CPU budget",
 )
 
 
+class CgroupCpuCollector:
+    """Exposes available cores and cgroup CPU throttling at scrape time."""
+
+    def collect(self):
+        periods, seconds = cpu_throttling()
+        yield GaugeMetricFamily("cpu_available_cores", "Cores available to the process", value=available_cores())
+        yield CounterMetricFamily("cpu_throttled_periods", "CFS periods the cgroup was throttled", value=periods)
+        yield CounterMetricFamily("cpu_throttled_seconds", "Time the cgroup was throttled", value=seconds)
+
+
+REGISTRY.register(CgroupCpuCollector())
+
+
 class MetricsMiddleware(BaseHTTPMiddleware):
     """Middleware to collect Prometheus metrics."""
 
@@ -0,0 +1,120 @@
+"""Admin endpoints - operational controls protected by ADMIN_TOKEN."""
+import logging
+import secrets
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Check the admin token from 'Authorization: Bearer' or 'X-Admin-Token'."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin API disabled (ADMIN_TOKEN not set)")
+
+    token = x_admin_token
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token or not secrets.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.post("/drain")
+async def start_drain(timeout: Optional[float] = None):
+    """Start draining: refuse new work and let in-flight requests finish.
+
+    Intended for a preStop hook before a rolling deploy. Requests still
+    running at the deadline are cancelled and end with finishReason OTHER.
+
+    Args:
+        timeout: Seconds until cancellation (defaults to DRAIN_TIMEOUT)
+
+    Returns:
+        Drain progress
+    """
+    model_registry.start_drain(timeout if timeout is not None else settings.drain_timeout)
+    return model_registry.drain_status()
+
+
+@router.get("/drain")
+async def drain_status():
+    """Report drain progress.
+
+    Returns:
+        Whether draining, requests in flight and time left to the deadline
+    """
+    return model_registry.drain_status()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=300),
+    mode: profiling.ProfileMode = "wall",
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+):
+    """Sample stacks of all threads (event loop, executors, decode threads).
+
+    Returns collapsed stacks for flamegraph.pl / speedscope, e.g.
+    ``curl -H "X-Admin-Token: ..." ".../admin/profile?seconds=30&mode=cpu" > out.folded``
+
+    Args:
+        seconds: Sampling duration
+        mode: "wall" (all samples) or "cpu" (weighted by thread CPU microseconds)
+        interval_ms: Sampling interval
+    """
+    logger.info(f"Profiling for {seconds}s ({mode})")
+    try:
+        stacks = await profiling.run_in_thread(profiling.sample_stacks, seconds, interval_ms / 1000, mode)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="profile-{mode}.folded"'},
+    )
+
+
+@router.get("/profile/tasks")
+async def profile_tasks(limit: int = Query(20, ge=1, le=200)):
+    """Dump asyncio tasks and the current stack of every thread.
+
+    Args:
+        limit: Maximum stack frames per task
+    """
+    return profiling.dump_tasks(limit)
+
+
+@router.get("/profile/memory")
+async def profile_memory(
+    seconds: float = Query(10.0, ge=0, le=300),
+    top: int = Query(25, ge=1, le=500),
+    frames: int = Query(1, ge=1, le=50),
+    key_type: Literal["lineno", "filename", "traceback"] = "lineno",
+):
+    """Trace Python allocations for a while and return the top-N sites.
+
+    Only allocations made while tracing (and still alive at the snapshot)
+    are seen; memory allocated by llama.cpp itself is not traced.
+
+    Args:
+        seconds: Tracing duration
+        top: Number of allocation sites
+        frames: Traceback depth per allocation
+        key_type: Grouping of allocations
+    """
+    logger.info(f"Tracing memory allocations for {seconds}s")
+    try:
+        return await profiling.run_in_thread(profiling.memory_top, seconds, top, frames, key_type)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -1,17 +1,26 @@
 """Embeddings endpoint - Gemini-compatible API."""
 import logging
-import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 
-from app.models.schemas import EmbedContentRequest, EmbedContentResponse, ContentEmbedding
-from app.core.config import settings
+from app.models.schemas import EmbedContentRequest, EmbedContentResponse
+from app.api.body import json_body, json_body_openapi
+from app.core.embeddings import EmbeddingsServiceError, EmbeddingsUnavailableError, embeddings_backend
+from app.core.registry import model_registry
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/models/{model_name}/embedContent", response_model=EmbedContentResponse)
-async def embed_content(model_name: str, request: EmbedContentRequest):
+@router.post(
+    "/models/{model_name}/embedContent",
+    response_model=EmbedContentResponse,
+    openapi_extra=json_body_openapi(EmbedContentRequest),
+)
+async def embed_content(
+    model_name: str,
+    request: EmbedContentRequest = Depends(json_body(EmbedContentRequest)),
+):
     """Generate embeddings for text (Gemini-compatible endpoint).
 
     Args:
@@ -21,37 +30,18 @@ async def embed_content(model_name: str, request: EmbedContentRequest):
     Returns:
         EmbedContentResponse with embedding vector (768 dimensions)
     """
+    if model_registry.draining:
+        raise HTTPException(status_code=503, detail="Server is draining")
+
     try:
-        # Call embeddings service
-        embeddings_url = f"http://{settings.embeddings_host}:{settings.embeddings_port}/embed"
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                embeddings_url,
-                json={"text": request.content},
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Embeddings service error: {response.text}",
-                )
-
-            data = response.json()
-            embedding_values = data["embedding"]
-
-            logger.info(f"Generated embedding with {len(embedding_values)} dimensions")
-
-            return EmbedContentResponse(
-                embedding=ContentEmbedding(values=embedding_values)
-            )
-
-    except httpx.RequestError as e:
-        logger.error(f"Failed to connect to embeddings service: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail="Embeddings service unavailable",
-        )
+        embedding_values = await embeddings_backend.embed(request.content)
+        logger.info(f"Generated embedding with {len(embedding_values)} dimensions")
+        return ORJSONResponse({"embedding": {"values": embedding_values}})
+
+    except EmbeddingsUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except EmbeddingsServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Embedding error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,27 +1,123 @@
 """Generation endpoints - Gemini-compatible API."""
+import asyncio
 import logging
+import math
 import time
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from typing import AsyncGenerator
+from contextlib import AsyncExitStack
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Optional
 
 from app.models.schemas import (
     GenerateContentRequest,
     GenerateContentResponse,
-    Candidate,
-    Content,
-    TextPart,
-    UsageMetadata,
+    CountTokensRequest,
+    CountTokensResponse,
+    BatchCountTokensRequest,
+    BatchCountTokensResponse,
+    GenerationConfig,
 )
-from app.core.inference import inference_engine
+from app.core.registry import (
+    model_registry,
+    ModelNotFoundError,
+    ModelBudgetExceededError,
+    DrainingError,
+    ModelLoadError,
+)
+from app.core.budget import ContextOverflowError
+from app.core.grammar import JSON_MIME_TYPE, GrammarError, grammar_cache
 from app.core.config import settings
+from app.api import sse
+from app.api.body import json_body, json_body_openapi
+from app.api.middleware.metrics import INFERENCE_LATENCY, TOKENS_PER_SECOND, GENERATED_TOKENS, STRUCTURED_OUTPUTS
+
+if TYPE_CHECKING:
+    from llama_cpp import LlamaGrammar
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/models/{model_name}/generateContent", response_model=GenerateContentResponse)
-async def generate_content(model_name: str, request: GenerateContentRequest):
+def _check_model(model_name: str):
+    """Raise 404 for unknown models and 503 if draining or a failed load is backing off.
+
+    Models that are merely unloaded (never used yet, or evicted) are loaded
+    on demand by ``model_registry.use``, and so is a failed model once its
+    retry backoff has passed.
+    """
+    if model_registry.draining:
+        raise HTTPException(status_code=503, detail="Server is draining")
+    try:
+        model_registry.get(model_name)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    retry_in = model_registry.load_retry_in(model_name)
+    if retry_in > 0:
+        raise HTTPException(
+            status_code=503,
+            detail="Model failed to load",
+            headers={"Retry-After": str(math.ceil(retry_in))},
+        )
+
+
+class _UsageStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases the model when the response is over.
+
+    The body generator releases it as soon as generation ends; this covers a
+    client that disconnects before the body generator ever started, whose
+    ``finally`` would then never run.
+    """
+
+    def __init__(self, content, usage: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.usage = usage
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.usage.aclose()
+
+
+def _reserve_tokens(config, engine) -> int:
+    """Output tokens to reserve when budgeting the prompt.
+
+    An explicit maxOutputTokens must fit; the default is only a ceiling and is
+    clamped by the slot, so only the slot output reserve is budgeted for it.
+    """
+    if config and config.maxOutputTokens is not None:
+        return config.maxOutputTokens
+    return min(settings.default_max_tokens, engine.config.output_reserve_tokens)
+
+
+async def _response_grammar(config: GenerationConfig) -> Optional["LlamaGrammar"]:
+    """Parsed grammar enforcing JSON output, or None for plain text."""
+    if config.responseMimeType != JSON_MIME_TYPE:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, grammar_cache.get, config.responseSchema)
+
+
+def _record_structured_output(model_name: str, text: str):
+    """Count whether a JSON-mode candidate parsed, so retries can be tracked."""
+    try:
+        orjson.loads(text)
+        result = "valid"
+    except orjson.JSONDecodeError:
+        result = "invalid"
+    STRUCTURED_OUTPUTS.labels(model=model_name, result=result).inc()
+
+
+@router.post(
+    "/models/{model_name}/generateContent",
+    response_model=GenerateContentResponse,
+    openapi_extra=json_body_openapi(GenerateContentRequest),
+)
+async def generate_content(
+    model_name: str,
+    request: GenerateContentRequest = Depends(json_body(GenerateContentRequest)),
+):
     """Generate content synchronously (Gemini-compatible endpoint).
 
     Args:
@@ -31,70 +127,93 @@ async def generate_content(model_name: str, request: GenerateContentRequest):
     Returns:
         GenerateContentResponse with generated text and usage metadata
     """
-    if not inference_engine.is_loaded():
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    _check_model(model_name)
 
     try:
-        # Format chat prompt
-        contents_dict = [c.model_dump() for c in request.contents]
-        prompt = inference_engine.format_chat_prompt(contents_dict)
-
         logger.info(f"Generate request for model: {model_name}")
-        logger.debug(f"Prompt length: {len(prompt)} chars")
 
         # Get generation config or use defaults
-        config = request.generationConfig or {}
+        config = request.generationConfig or GenerationConfig()
         temperature = config.temperature if config.temperature is not None else settings.default_temperature
         max_tokens = config.maxOutputTokens if config.maxOutputTokens is not None else settings.default_max_tokens
         top_k = config.topK if config.topK is not None else settings.default_top_k
         top_p = config.topP if config.topP is not None else settings.default_top_p
         stop = config.stopSequences or ["<end_of_turn>"]
+        candidate_count = config.candidateCount or 1
+        grammar = await _response_grammar(config)
 
         # Generate
         start_time = time.time()
-        result = await inference_engine.generate(
-            prompt=prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_k=top_k,
-            top_p=top_p,
-            stop=stop,
-        )
+        async with model_registry.use(model_name) as engine:
+            # Tokenize and fit into the context before any inference work
+            reserve_tokens = _reserve_tokens(request.generationConfig, engine)
+            prompt = await engine.prepare_prompt(request.contents, reserve_tokens)
+            logger.debug(f"Prompt length: {len(prompt)} tokens")
+
+            result = await engine.generate(
+                prompt=prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_k=top_k,
+                top_p=top_p,
+                stop=stop,
+                candidate_count=candidate_count,
+                grammar=grammar,
+                reserve_tokens=reserve_tokens,
+            )
         elapsed = time.time() - start_time
 
+        if grammar is not None:
+            for candidate in result["candidates"]:
+                _record_structured_output(model_name, candidate["text"])
+
+        INFERENCE_LATENCY.labels(model=model_name, method="generateContent").observe(elapsed)
+        GENERATED_TOKENS.labels(model=model_name).inc(result["completion_tokens"])
+        if elapsed > 0:
+            TOKENS_PER_SECOND.labels(model=model_name).set(result["completion_tokens"] / elapsed)
+
         logger.info(
             f"Generated {result['completion_tokens']} tokens in {elapsed:.2f}s "
             f"({result['completion_tokens']/elapsed:.1f} tok/s)"
         )
 
-        # Build response in Gemini format
-        response = GenerateContentResponse(
-            candidates=[
-                Candidate(
-                    content=Content(
-                        role="model",
-                        parts=[TextPart(text=result["text"])],
-                    ),
-                    finishReason="STOP",
-                    index=0,
-                )
+        # Build response in Gemini format (same shape as GenerateContentResponse),
+        # serialized straight to JSON without constructing pydantic models
+        return ORJSONResponse({
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": candidate["text"]}]},
+                    "finishReason": candidate["finish_reason"],
+                    "index": index,
+                }
+                for index, candidate in enumerate(result["candidates"])
             ],
-            usageMetadata=UsageMetadata(
-                promptTokenCount=result["prompt_tokens"],
-                candidatesTokenCount=result["completion_tokens"],
-                totalTokenCount=result["total_tokens"],
-            ),
-        )
-
-        return response
+            "usageMetadata": {
+                "promptTokenCount": result["prompt_tokens"],
+                "candidatesTokenCount": result["completion_tokens"],
+                "totalTokenCount": result["total_tokens"],
+                "thoughtsTokenCount": 0,
+                "cachedContentTokenCount": 0,
+            },
+        })
 
+    except (ContextOverflowError, GrammarError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (ModelBudgetExceededError, DrainingError, ModelLoadError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Generation error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/models/{model_name}/generateContentStream")
-async def generate_content_stream(model_name: str, request: GenerateContentRequest):
+@router.post(
+    "/models/{model_name}/generateContentStream",
+    openapi_extra=json_body_openapi(GenerateContentRequest),
+)
+async def generate_content_stream(
+    model_name: str,
+    request: GenerateContentRequest = Depends(json_body(GenerateContentRequest)),
+):
     """Generate content with streaming (Gemini-compatible endpoint).
 
     Args:
@@ -104,74 +223,71 @@ async def generate_content_stream(model_name: str, request: GenerateContentReque
     Returns:
         Streaming response with SSE format
     """
-    if not inference_engine.is_loaded():
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    _check_model(model_name)
 
     try:
-        # Format chat prompt
-        contents_dict = [c.model_dump() for c in request.contents]
-        prompt = inference_engine.format_chat_prompt(contents_dict)
-
         logger.info(f"Stream request for model: {model_name}")
 
         # Get generation config or use defaults
-        config = request.generationConfig or {}
+        config = request.generationConfig or GenerationConfig()
         temperature = config.temperature if config.temperature is not None else settings.default_temperature
         max_tokens = config.maxOutputTokens if config.maxOutputTokens is not None else settings.default_max_tokens
         top_k = config.topK if config.topK is not None else settings.default_top_k
         top_p = config.topP if config.topP is not None else settings.default_top_p
         stop = config.stopSequences or ["<end_of_turn>"]
+        candidate_count = config.candidateCount or 1
+        grammar = await _response_grammar(config)
+
+        # One use() from budgeting to the end of the stream, so the model can
+        # neither be evicted nor have a drain finish in between; budgeting
+        # happens before the response starts so overflow is a 400
+        usage = AsyncExitStack()
+        engine = await usage.enter_async_context(model_registry.use(model_name))
+        try:
+            reserve_tokens = _reserve_tokens(request.generationConfig, engine)
+            prompt = await engine.prepare_prompt(request.contents, reserve_tokens)
+        except BaseException:
+            await usage.aclose()
+            raise
 
         async def stream_generator() -> AsyncGenerator[bytes, None]:
             """Generate SSE stream."""
+            start_time = time.time()
+            # JSON-mode candidate texts, checked once each candidate finishes
+            texts: Dict[int, List[str]] = {}
             try:
-                async for chunk_text in inference_engine.generate_stream(
+                async for chunk in engine.generate_stream(
                     prompt=prompt,
                     temperature=temperature,
                     max_tokens=max_tokens,
                     top_k=top_k,
                     top_p=top_p,
                     stop=stop,
+                    candidate_count=candidate_count,
+                    grammar=grammar,
+                    reserve_tokens=reserve_tokens,
                 ):
-                    # Format as Gemini-style JSON chunk
-                    chunk_response = {
-                        "candidates": [
-                            {
-                                "content": {
-                                    "role": "model",
-                                    "parts": [{"text": chunk_text}],
-                                },
-                                "finishReason": None,
-                                "index": 0,
-                            }
-                        ],
-                    }
-
-                    # Send as JSON
-                    import json
-                    yield f"data: {json.dumps(chunk_response)}\n\n".encode("utf-8")
-
-                # Send final chunk with finish reason
-                final_chunk = {
-                    "candidates": [
-                        {
-                            "content": {"role": "model", "parts": [{"text": ""}]},
-                            "finishReason": "STOP",
-                            "index": 0,
-                        }
-                    ],
-                }
-                import json
-                yield f"data: {json.dumps(final_chunk)}\n\n".encode("utf-8")
+                    # Gemini-style chunk, interleaved by candidate index;
+                    # the last chunk of a candidate carries its finish reason
+                    yield sse.text_chunk(chunk.text, chunk.finish_reason, chunk.index)
+                    if grammar is not None:
+                        texts.setdefault(chunk.index, []).append(chunk.text)
+                        if chunk.finish_reason:
+                            _record_structured_output(model_name, "".join(texts.pop(chunk.index)))
+
+                INFERENCE_LATENCY.labels(model=model_name, method="generateContentStream").observe(
+                    time.time() - start_time
+                )
 
             except Exception as e:
                 logger.error(f"Streaming error: {e}", exc_info=True)
-                error_chunk = {"error": str(e)}
-                import json
-                yield f"data: {json.dumps(error_chunk)}\n\n".encode("utf-8")
+                yield sse.error_chunk(str(e))
+            finally:
+                await usage.aclose()
 
-        return StreamingResponse(
+        return _UsageStreamingResponse(
             stream_generator(),
+            usage,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -179,6 +295,81 @@ async def generate_content_stream(model_name: str, request: GenerateContentReque
             },
         )
 
+    except HTTPException:
+        raise
+    except (ContextOverflowError, GrammarError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (ModelBudgetExceededError, DrainingError, ModelLoadError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Stream setup error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/models/{model_name}/countTokens",
+    response_model=CountTokensResponse,
+    openapi_extra=json_body_openapi(CountTokensRequest),
+)
+async def count_tokens(
+    model_name: str,
+    request: CountTokensRequest = Depends(json_body(CountTokensRequest)),
+):
+    """Count prompt tokens (Gemini-compatible endpoint).
+
+    Uses a vocab-only tokenizer and the same chat template as generation, so
+    the count matches usageMetadata.promptTokenCount without loading the model
+    or occupying an inference slot.
+
+    Args:
+        model_name: Model identifier
+        request: Contents to count
+
+    Returns:
+        CountTokensResponse with the total token count
+    """
+    try:
+        engine = model_registry.get(model_name)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        total = await engine.count_tokens(request.contents)
+        return ORJSONResponse({"totalTokens": total})
+    except Exception as e:
+        logger.error(f"Count tokens error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/models/{model_name}/batchCountTokens",
+    response_model=BatchCountTokensResponse,
+    openapi_extra=json_body_openapi(BatchCountTokensRequest),
+)
+async def batch_count_tokens(
+    model_name: str,
+    request: BatchCountTokensRequest = Depends(json_body(BatchCountTokensRequest)),
+):
+    """Count prompt tokens for several requests at once.
+
+    Args:
+        model_name: Model identifier
+        request: List of countTokens requests
+
+    Returns:
+        BatchCountTokensResponse with one count per request, in order
+    """
+    try:
+        engine = model_registry.get(model_name)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        totals = [
+            await engine.count_tokens(item.contents)
+            for item in request.requests
+        ]
+        return ORJSONResponse({"results": [{"totalTokens": total} for total in totals]})
+    except Exception as e:
+        logger.error(f"Batch count tokens error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,9 @@
 """Models endpoint - list available models."""
 import logging
-from fastapi import APIRouter
-from app.models.schemas import ListModelsResponse, ModelInfo, HealthResponse
-from app.core.inference import inference_engine
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
+from app.models.schemas import ListModelsResponse, ModelInfo, HealthResponse, ListSlotsResponse, SlotInfo
+from app.core.registry import model_registry, ModelNotFoundError
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -18,14 +19,17 @@ async def list_models():
     """
     models = [
         ModelInfo(
-            name=settings.model_name,
+            name=engine.config.name,
             version="1.0",
-            displayName="MamayLM Gemma 3 12B IT",
-            description="Ukrainian-optimized Gemma 3 12B Instruct model (Q5_K_M quantization)",
-            inputTokenLimit=settings.model_context_size,
-            outputTokenLimit=settings.default_max_tokens,
-            supportedGenerationMethods=["generateContent", "generateContentStream"],
-        ),
+            displayName=engine.config.display_name or engine.config.name,
+            description=engine.config.description,
+            inputTokenLimit=engine.config.context_size,
+            outputTokenLimit=min(settings.default_max_tokens, engine.config.context_size),
+            supportedGenerationMethods=["generateContent", "generateContentStream", "countTokens"],
+        )
+        for engine in model_registry.engines.values()
+    ]
+    models.append(
         ModelInfo(
             name="text-embedding-multilingual",
             version="1.0",
@@ -34,12 +38,36 @@ async def list_models():
             inputTokenLimit=512,
             outputTokenLimit=0,
             supportedGenerationMethods=["embedContent"],
-        ),
-    ]
+        )
+    )
 
     return ListModelsResponse(models=models)
 
 
+@router.get("/models/{model_name}/slots", response_model=ListSlotsResponse)
+async def list_slots(model_name: str):
+    """Report context slots of a model and KV cache memory per slot.
+
+    Args:
+        model_name: Model identifier
+
+    Returns:
+        Slots with their pool, context size and estimated KV cache size
+    """
+    try:
+        engine = model_registry.get(model_name)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    slots = [SlotInfo(**info) for info in engine.slot_info()]
+    return ListSlotsResponse(
+        model=model_name,
+        loaded=engine.is_loaded(),
+        slots=slots,
+        totalKvCacheBytes=sum(slot.kvCacheBytes for slot in slots if slot.allocated),
+    )
+
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint.
@@ -47,8 +75,29 @@ async def health_check():
     Returns:
         Health status with model information
     """
+    model_loaded = model_registry.is_loaded(model_registry.default_model)
+    # An evicted primary model is reloaded on demand, so only a failed load is unhealthy
+    failed = model_registry.load_error(model_registry.default_model) is not None
+    status = "model_not_loaded" if failed else "healthy"
+    if model_registry.draining:
+        status = "draining"
     return HealthResponse(
-        status="healthy" if inference_engine.is_loaded() else "model_not_loaded",
-        model_loaded=inference_engine.is_loaded(),
+        status=status,
+        model_loaded=model_loaded,
+        loaded_models=model_registry.loaded_models(),
         gpu=settings.model_gpu_layers > 0,
     )
+
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness check - fails while draining so no new traffic is routed here.
+
+    Returns:
+        200 when ready to accept work, 503 otherwise
+    """
+    if model_registry.draining:
+        return ORJSONResponse({"status": "draining", **model_registry.drain_status()}, status_code=503)
+    if model_registry.load_error(model_registry.default_model):
+        return ORJSONResponse({"status": "model_not_loaded"}, status_code=503)
+    return {"status": "ready"}
@@ -0,0 +1,36 @@
+"""Pre-serialized Server-Sent Events frames for streaming responses.
+
+Streaming chunks only differ in text, finish reason and candidate index, so
+frames are assembled from constant byte templates instead of building and
+encoding a nested dict per chunk.
+"""
+import orjson
+
+_CHUNK_HEAD = b'data: {"candidates":[{"content":{"role":"model","parts":[{"text":'
+_CHUNK_FINISH = b'}]},"finishReason":'
+_CHUNK_INDEX = b',"index":'
+_CHUNK_TAIL = b"}]}\n\n"
+
+
+def _encode_text(text: str) -> bytes:
+    # orjson keeps Cyrillic as 2-byte UTF-8 instead of 6-byte escapes
+    return orjson.dumps(text)
+
+
+def text_chunk(text: str, finish_reason: str = None, index: int = 0) -> bytes:
+    """SSE frame with a Gemini-style candidate chunk."""
+    reason = b"null" if finish_reason is None else b'"' + finish_reason.encode("ascii") + b'"'
+    return b"".join((
+        _CHUNK_HEAD,
+        _encode_text(text),
+        _CHUNK_FINISH,
+        reason,
+        _CHUNK_INDEX,
+        str(index).encode("ascii"),
+        _CHUNK_TAIL,
+    ))
+
+
+def error_chunk(message: str) -> bytes:
+    """SSE frame reporting a streaming error."""
+    return b"data: " + orjson.dumps({"error": message}) + b"\n\n"
@@ -0,0 +1,88 @@
+"""Token budgeting: fit a conversation into the context before inference."""
+from typing import List, Tuple
+
+POLICIES = ("reject", "drop_oldest", "keep_head")
+
+
+class ContextOverflowError(ValueError):
+    """Prompt plus requested output does not fit into the model context."""
+
+
+class HeadTurnsOverflowError(ContextOverflowError):
+    """The turns pinned by 'keep_head' alone exceed the context budget."""
+
+
+def plan_context(
+    turns: List[Tuple[str, int]],
+    context_size: int,
+    reserve_tokens: int,
+    fixed_tokens: int = 0,
+    policy: str = "reject",
+    keep_head_turns: int = 1,
+) -> List[int]:
+    """Select which conversation turns to keep so the prompt fits.
+
+    Args:
+        turns: (role, token count) for every turn, oldest first
+        context_size: Largest context the model can serve
+        reserve_tokens: Tokens reserved for the output
+        fixed_tokens: Tokens always present (BOS, generation prompt)
+        policy: 'reject' fails fast, 'drop_oldest' drops the oldest turns,
+            'keep_head' keeps the first turns plus a window of recent turns
+        keep_head_turns: Number of leading turns kept by 'keep_head'
+
+    Returns:
+        Indices of turns to keep, in order
+
+    Raises:
+        HeadTurnsOverflowError: If the turns kept by 'keep_head' do not fit
+        ContextOverflowError: If the request cannot fit under the policy
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown context overflow policy '{policy}'")
+
+    budget = context_size - reserve_tokens - fixed_tokens
+    if budget <= 0:
+        raise ContextOverflowError(
+            f"maxOutputTokens={reserve_tokens} leaves no room for the prompt "
+            f"in the {context_size}-token context"
+        )
+
+    total = sum(n for _, n in turns)
+    if total <= budget:
+        return list(range(len(turns)))
+
+    if policy == "reject":
+        raise ContextOverflowError(
+            f"Prompt is {total + fixed_tokens} tokens but only {budget + fixed_tokens} fit "
+            f"in the {context_size}-token context with maxOutputTokens={reserve_tokens}"
+        )
+
+    head: List[int] = []
+    if policy == "keep_head":
+        head = list(range(min(keep_head_turns, len(turns) - 1)))
+    used = sum(turns[i][1] for i in head)
+    if used > budget:
+        raise HeadTurnsOverflowError(
+            f"The first {len(head)} turn(s) kept by keep_head are {used} tokens but only "
+            f"{budget} fit in the {context_size}-token context with "
+            f"maxOutputTokens={reserve_tokens}; shorten them or lower CONTEXT_KEEP_HEAD_TURNS"
+        )
+
+    # Fill a window of recent turns, newest first, that starts with a user turn
+    window: List[int] = []
+    for i in range(len(turns) - 1, len(head) - 1, -1):
+        if used + turns[i][1] > budget:
+            break
+        used += turns[i][1]
+        window.insert(0, i)
+    while window and turns[window[0]][0] != "user" and len(window) > 1:
+        window.pop(0)
+
+    if not window or window[-1] != len(turns) - 1:
+        raise ContextOverflowError(
+            f"The last message is {turns[-1][1]} tokens and does not fit in the "
+            f"{context_size}-token context with maxOutputTokens={reserve_tokens}"
+        )
+
+    return head + window
@@ -0,0 +1,62 @@
+"""CPU limits of the current container from cgroups and the affinity mask.
+
+Standard library only: the embeddings service uses this module as well
+(its image copies it from the backend build context).
+"""
+import math
+import os
+from typing import Optional, Tuple
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPU quota of the current cgroup in cores, or None if unlimited."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(CGROUP_ROOT, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1
+    quota = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cores() -> int:
+    """Cores usable by this process: affinity mask capped by the cgroup quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cores = min(cores, max(1, math.floor(quota)))
+    return cores
+
+
+def cpu_throttling() -> Tuple[int, float]:
+    """(throttled periods, throttled seconds) of the current cgroup."""
+    stat = _read(os.path.join(CGROUP_ROOT, "cpu.stat"))
+    if stat is not None:
+        values = dict(line.split() for line in stat.splitlines() if " " in line)
+        return int(values.get("nr_throttled", 0)), int(values.get("throttled_usec", 0)) / 1e6
+
+    stat = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.stat"))
+    if stat is not None:
+        values = dict(line.split() for line in stat.splitlines() if " " in line)
+        return int(values.get("nr_throttled", 0)), int(values.get("throttled_time", 0)) / 1e9
+    return 0, 0.0
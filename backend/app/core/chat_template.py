@@ -0,0 +1,83 @@
+"""Incremental Gemma-3 chat template with token-level caching."""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from app.core.tokenizer import Tokenizer
+from app.models.schemas import Content
+
+
+@dataclass
+class EncodedPrompt:
+    """A conversation tokenized turn by turn."""
+
+    prefix: List[int]
+    turns: List[Tuple[str, List[int]]] = field(default_factory=list)
+    suffix: List[int] = field(default_factory=list)
+
+    @property
+    def fixed_tokens(self) -> int:
+        """Tokens present regardless of which turns are kept."""
+        return len(self.prefix) + len(self.suffix)
+
+    def __len__(self) -> int:
+        return self.fixed_tokens + sum(len(tokens) for _, tokens in self.turns)
+
+    def token_ids(self, keep: Optional[Iterable[int]] = None) -> List[int]:
+        """Concatenate token ids of the kept turns (all by default)."""
+        indices = range(len(self.turns)) if keep is None else keep
+        ids = list(self.prefix)
+        for i in indices:
+            ids.extend(self.turns[i][1])
+        ids.extend(self.suffix)
+        return ids
+
+
+class ChatTemplate:
+    """Gemma-3 chat template that renders and tokenizes each turn separately.
+
+    Gemma-3 uses a specific format:
+    <start_of_turn>user
+    message<end_of_turn>
+    <start_of_turn>model
+    response<end_of_turn>
+
+    Every turn ends at a special token, so tokenizing turns one by one gives
+    the same ids as tokenizing the whole prompt. Token arrays are cached per
+    (role, text hash) and concatenated directly; the full prompt string is
+    never built for inference.
+    """
+
+    # Opens the model turn the completion is generated in
+    generation_prompt = "<start_of_turn>model\n"
+
+    def __init__(self, tokenizer: Tokenizer):
+        self.tokenizer = tokenizer
+
+    @staticmethod
+    def turn_text(content: Content) -> str:
+        """Concatenate text parts of a message."""
+        return "".join(part.text for part in content.parts)
+
+    @staticmethod
+    def render_turn(role: str, text: str) -> str:
+        """Render a single turn, including its trailing newline."""
+        return f"<start_of_turn>{role}\n{text}<end_of_turn>\n"
+
+    def render(self, contents: List[Content]) -> str:
+        """Render the whole conversation as a prompt string."""
+        turns = [self.render_turn(c.role, self.turn_text(c)) for c in contents]
+        return "".join(turns) + self.generation_prompt
+
+    def _encode_turn(self, role: str, text: str) -> List[int]:
+        key = (role, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+        return self.tokenizer.tokenize_segment(self.render_turn(role, text), key=key)
+
+    def encode(self, contents: List[Content]) -> EncodedPrompt:
+        """Tokenize a conversation turn by turn, using the token cache."""
+        self.tokenizer.load()
+        return EncodedPrompt(
+            prefix=[self.tokenizer.token_bos()],
+            turns=[(c.role, self._encode_turn(c.role, self.turn_text(c))) for c in contents],
+            suffix=self.tokenizer.tokenize_segment(self.generation_prompt),
+        )
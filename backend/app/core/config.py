@@ -1,6 +1,42 @@
 """Configuration management using pydantic-settings."""
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Literal, Optional
+
+
+class ModelConfig(BaseModel):
+    """Configuration of a single GGUF model served by the registry."""
+
+    name: str
+    path: str
+    display_name: Optional[str] = None
+    description: str = ""
+    context_size: int = 8192
+    # Threads per context; with the CPU budget enabled, the upper bound of a
+    # sequence's share of the cores
+    threads: int = 8
+    batch_size: int = 512
+    gpu_layers: int = 0
+    # KV cache element types (f16, q8_0, q4_0, ...); quantized V needs flash_attn
+    type_k: str = "f16"
+    type_v: str = "f16"
+    flash_attn: bool = False
+    # Ordinary requests run in small-context slots; prompts that do not fit
+    # are placed in the long-context pool (context_size). 0 disables small slots.
+    small_context_size: int = 0
+    small_slots: int = 3
+    long_slots: int = 1
+    # KV cache types of long slots (None = type_k/type_v). With small slots,
+    # long slots are created on the first request that needs one.
+    long_type_k: Optional[str] = None
+    long_type_v: Optional[str] = None
+    # Use a free larger slot instead of waiting when the fitting pool is full
+    slot_fallback: bool = True
+    # Output tokens reserved when placing a request in a slot; max_tokens is
+    # clamped to the context left in the chosen slot
+    output_reserve_tokens: int = 1024
+    # Load at startup instead of on first request
+    preload: bool = False
 
 
 class Settings(BaseSettings):
@@ -18,6 +54,30 @@ class Settings(BaseSettings):
     model_threads: int = 16
     model_batch_size: int = 512
     model_gpu_layers: int = 0
+    model_cache_type_k: str = "f16"
+    model_cache_type_v: str = "f16"
+    model_flash_attn: bool = False
+
+    # Context slots: small-context slots for ordinary requests plus a
+    # separate pool of full-context slots for long prompts
+    model_small_context_size: int = 8192
+    model_small_slots: int = 3
+    model_long_slots: int = 1
+    # The long slot is created lazily and keeps K in q8_0, so 3 small slots
+    # plus a busy long slot stay below a single f16 context of
+    # model_context_size (quantized V would also need flash attention)
+    model_long_cache_type_k: str = "q8_0"
+    model_long_cache_type_v: str = "f16"
+    model_slot_fallback: bool = True
+    model_output_reserve_tokens: int = 1024
+
+    # Additional models served next to the primary one, as a JSON list of
+    # ModelConfig objects, e.g.
+    # MODELS='[{"name": "gemma-3-1b", "path": "/app/models/gemma-3-1b.gguf"}]'
+    models: List[ModelConfig] = []
+    # Total memory budget for loaded models in GB (0 = unlimited).
+    # Least recently used idle models are unloaded to stay under it.
+    models_memory_budget_gb: float = 0.0
 
     # Generation Defaults
     default_temperature: float = 0.3
@@ -25,16 +85,71 @@ class Settings(BaseSettings):
     default_top_k: int = 40
     default_top_p: float = 0.95
 
+    # Context budgeting: what to do when a conversation exceeds the context.
+    # reject - fail fast with 400; drop_oldest - drop the oldest turns;
+    # keep_head - keep the first turns plus a window of recent turns
+    context_overflow_policy: Literal["reject", "drop_oldest", "keep_head"] = "reject"
+    context_keep_head_turns: int = 1
+    # Total tokens of cached tokenized prompt segments per model
+    token_cache_max_tokens: int = 1_000_000
+    # Compiled JSON grammars for responseSchema, keyed by schema hash
+    grammar_cache_size: int = 64
+
+    # Streaming: coalesce generated tokens into one SSE frame per flush,
+    # after this many tokens or this many milliseconds, whichever comes first
+    stream_flush_tokens: int = 4
+    stream_flush_interval_ms: int = 50
+
     # Embeddings Configuration
     embeddings_model: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
     embeddings_dimensions: int = 768
     embeddings_host: str = "embeddings-service"
     embeddings_port: int = 8001
+    # "http" calls the embeddings service; "inprocess" runs the model in a
+    # worker subprocess of the backend (needs sentence-transformers installed)
+    embeddings_mode: Literal["http", "inprocess"] = "http"
+    # Torch threads of the in-process worker; the embeddings service reads
+    # the same variable (docker-compose defaults both to 4)
+    embeddings_threads: int = 4
+    # Concurrent in-process requests (shared memory result slots)
+    embeddings_inprocess_slots: int = 64
+
+    # Maximum request body size in MB (0 = unlimited); larger bodies get 413
+    max_request_body_mb: float = 32.0
 
     # Concurrency
     max_concurrent_requests: int = 4
     request_timeout: int = 300
 
+    # CPU budget: llama.cpp threads are split between running sequences.
+    # cpu_limit 0 = detect from cgroup quota and affinity; reserved cores are
+    # left for the event loop and a co-located embeddings service
+    # (None = embeddings_threads + 1, see reserved_cores()).
+    cpu_budget_enabled: bool = True
+    cpu_limit: int = 0
+    cpu_reserved_cores: Optional[int] = None
+    decode_max_threads: int = 8
+
+    # Chunked prefill: long prompts are evaluated in chunks of at most
+    # prefill_chunk_tokens; all slots share step_token_budget tokens per step
+    # (minus running decoders), shortest remaining prompt first. Prompts of
+    # long_prompt_tokens or more count as long in fairness metrics.
+    prefill_chunk_tokens: int = 512
+    step_token_budget: int = 1024
+    long_prompt_tokens: int = 4096
+
+    # A failed model load is retried on use after model_load_retry_seconds,
+    # doubling per consecutive failure up to model_load_retry_max_seconds
+    model_load_retry_seconds: float = 10.0
+    model_load_retry_max_seconds: float = 300.0
+
+    # Graceful shutdown: seconds in-flight generations may run after a drain
+    # starts (SIGTERM or POST /admin/drain) before they are cancelled
+    drain_timeout: float = 30.0
+
+    # Admin API (drain, profiling); disabled unless a token is set
+    admin_token: Optional[str] = None
+
     # Monitoring
     enable_metrics: bool = True
     metrics_port: int = 9090
@@ -46,6 +161,41 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
 
+    def reserved_cores(self) -> int:
+        """Cores kept out of the llama.cpp budget.
+
+        Defaults to the embeddings threads plus one core for the event loop,
+        so raising EMBEDDINGS_THREADS cannot oversubscribe the CPU.
+        """
+        if self.cpu_reserved_cores is not None:
+            return self.cpu_reserved_cores
+        return self.embeddings_threads + 1
+
+    def model_configs(self) -> List[ModelConfig]:
+        """Return configs of all served models, the primary model first."""
+        primary = ModelConfig(
+            name=self.model_name,
+            path=self.model_path,
+            display_name="MamayLM Gemma 3 12B IT",
+            description="Ukrainian-optimized Gemma 3 12B Instruct model (Q5_K_M quantization)",
+            context_size=self.model_context_size,
+            threads=self.model_threads,
+            batch_size=self.model_batch_size,
+            gpu_layers=self.model_gpu_layers,
+            type_k=self.model_cache_type_k,
+            type_v=self.model_cache_type_v,
+            flash_attn=self.model_flash_attn,
+            small_context_size=self.model_small_context_size,
+            small_slots=self.model_small_slots,
+            long_slots=self.model_long_slots,
+            long_type_k=self.model_long_cache_type_k,
+            long_type_v=self.model_long_cache_type_v,
+            slot_fallback=self.model_slot_fallback,
+            output_reserve_tokens=self.model_output_reserve_tokens,
+            preload=True,
+        )
+        return [primary] + [m for m in self.models if m.name != self.model_name]
+
 
 # Global settings instance
 settings = Settings()
@@ -0,0 +1,86 @@
+"""CPU budget: thread counts for llama.cpp based on cores and concurrency.
+
+The cores available to the process are detected from the cgroup CPU quota
+and the scheduler affinity mask (not the host core count, which overstates
+what a container can use). They are split between running sequences, with
+separate counts for prefill (compute bound, scales with threads) and decode
+(memory-bandwidth bound, saturates early and suffers from oversubscription).
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import llama_cpp
+
+from app.core.cgroup import available_cores
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CpuBudget:
+    """Splits the CPU budget between concurrently running sequences."""
+
+    def __init__(self, cores: int, reserved_cores: int = 0, decode_max_threads: int = 8):
+        self.cores = max(1, cores - reserved_cores)
+        self.decode_max_threads = decode_max_threads
+        self.active = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def threads(self, max_threads: Optional[int] = None) -> Dict[str, int]:
+        """Current per-sequence thread counts for prefill and decode.
+
+        Args:
+            max_threads: Upper bound of the sequence's model (its ``threads``)
+        """
+        share = max(1, self.cores // max(1, self.active))
+        if max_threads:
+            share = min(share, max_threads)
+        return {"prefill": share, "decode": min(share, self.decode_max_threads)}
+
+    def _changed(self, delta: int):
+        with self._lock:
+            self.active += delta
+            self.version += 1
+
+    @contextmanager
+    def sequence(self, max_threads: Optional[int] = None) -> Iterator["SequenceLease"]:
+        """Register a running sequence for the duration of the block.
+
+        Args:
+            max_threads: Thread cap of the sequence's model
+        """
+        self._changed(1)
+        try:
+            yield SequenceLease(self, max_threads)
+        finally:
+            self._changed(-1)
+
+
+class SequenceLease:
+    """Applies the budget to one llama.cpp context when it changes."""
+
+    def __init__(self, budget: CpuBudget, max_threads: Optional[int] = None):
+        self.budget = budget
+        self.max_threads = max_threads
+        self._applied_version = -1
+
+    def apply(self, model) -> Optional[Dict[str, int]]:
+        """Set context thread counts if concurrency changed since last call."""
+        version = self.budget.version
+        if version == self._applied_version:
+            return None
+        self._applied_version = version
+        threads = self.budget.threads(self.max_threads)
+        llama_cpp.llama_set_n_threads(model.ctx, threads["decode"], threads["prefill"])
+        return threads
+
+
+# Global CPU budget shared by all models
+cpu_budget = CpuBudget(
+    cores=settings.cpu_limit or available_cores(),
+    reserved_cores=settings.reserved_cores(),
+    decode_max_threads=settings.decode_max_threads,
+)
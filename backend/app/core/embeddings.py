@@ -0,0 +1,292 @@
+"""Embedding backends: the embeddings service over HTTP, or an in-process worker.
+
+With ``EMBEDDINGS_MODE=inprocess`` the backend serves embedContent itself: a
+subprocess loads the sentence-transformers model (so torch never shares the
+GIL or the import of llama.cpp), micro-batches queued texts and writes the
+float32 vectors into a shared memory block, from which the event loop reads
+them without any JSON or pickling of the result.
+"""
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import httpx
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FLOAT32_BYTES = 4
+
+
+class EmbeddingsUnavailableError(RuntimeError):
+    """Raised when the embedding model cannot be reached or is not loaded."""
+
+
+class EmbeddingsServiceError(RuntimeError):
+    """Raised when the embeddings service answers with an error status."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class HttpEmbeddings:
+    """Embeddings from the embeddings-service container."""
+
+    def __init__(self, host: str, port: int, timeout: float = 30.0):
+        self.url = f"http://{host}:{port}/embed"
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """Open a keep-alive client for the embeddings service."""
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    def is_ready(self) -> bool:
+        """The service is checked on each request."""
+        return True
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text.
+
+        Raises:
+            EmbeddingsUnavailableError: If the service cannot be reached
+            EmbeddingsServiceError: If the service returns an error
+        """
+        if self._client is None:
+            await self.start()
+        try:
+            response = await self._client.post(self.url, json={"text": text})
+        except httpx.RequestError as e:
+            logger.error(f"Failed to connect to embeddings service: {e}")
+            raise EmbeddingsUnavailableError("Embeddings service unavailable") from e
+
+        if response.status_code != 200:
+            raise EmbeddingsServiceError(response.status_code, f"Embeddings service error: {response.text}")
+        return orjson.loads(response.content)["embedding"]
+
+    async def shutdown(self):
+        """Close the client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to the parent's block; the parent alone unlinks it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: spawned children share the parent's resource
+        # tracker, where registering the same name again is a no-op
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(model_name, dimensions, threads, max_batch, shm_name, requests, results):
+    """Embedding worker process: load the model and serve batches until None."""
+    shm = _attach_shared_memory(shm_name)
+    try:
+        import numpy as np
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name)
+        model_dimensions = model.get_sentence_embedding_dimension()
+        if model_dimensions != dimensions:
+            raise ValueError(f"{model_name} has {model_dimensions} dimensions, EMBEDDINGS_DIMENSIONS={dimensions}")
+    except Exception as e:
+        results.put(("failed", f"{type(e).__name__}: {e}"))
+        shm.close()
+        return
+    results.put(("ready", model_dimensions))
+
+    vector_bytes = dimensions * FLOAT32_BYTES
+    stopping = False
+    while not stopping:
+        batch = [requests.get()]
+        # Encode whatever queued up meanwhile in one forward pass
+        while len(batch) < max_batch:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        if None in batch:
+            stopping = True
+            batch = [item for item in batch if item is not None]
+        if not batch:
+            continue
+
+        try:
+            vectors = model.encode([text for _, text in batch], convert_to_numpy=True, batch_size=len(batch))
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            for (slot, _), vector in zip(batch, vectors):
+                shm.buf[slot * vector_bytes:(slot + 1) * vector_bytes] = vector.tobytes()
+            results.put(("done", [(slot, None) for slot, _ in batch]))
+        except Exception as e:
+            results.put(("done", [(slot, f"{type(e).__name__}: {e}") for slot, _ in batch]))
+    shm.close()
+
+
+class InProcessEmbeddings:
+    """Embeddings computed by a worker subprocess owned by the backend.
+
+    Each in-flight request owns one slot of a shared memory block of
+    ``slots x dimensions`` float32 values; the worker writes the vector into
+    that slot and only the slot index travels back over the result queue.
+    """
+
+    def __init__(self, model_name: str, dimensions: int, threads: int, slots: int = 64, max_batch: int = 32):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.threads = threads
+        self.slots = slots
+        self.max_batch = max_batch
+        self.error: Optional[str] = None
+        self._ready = False
+        self._process = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._requests = None
+        self._results = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._free_slots: Optional[asyncio.Queue] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    async def start(self):
+        """Start the worker; the model loads in the background."""
+        self._loop = asyncio.get_running_loop()
+        self._free_slots = asyncio.Queue()
+        for slot in range(self.slots):
+            self._free_slots.put_nowait(slot)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.dimensions * FLOAT32_BYTES)
+        # spawn: never fork a process holding llama.cpp threads and model memory
+        ctx = multiprocessing.get_context("spawn")
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(
+                self.model_name, self.dimensions, self.threads, self.max_batch,
+                self._shm.name, self._requests, self._results,
+            ),
+            name="embeddings-worker",
+            daemon=True,
+        )
+        self._process.start()
+        self._reader = threading.Thread(target=self._read_results, name="embeddings-results", daemon=True)
+        self._reader.start()
+        logger.info(f"Loading in-process embeddings model: {self.model_name} ({self.threads} threads)")
+
+    def is_ready(self) -> bool:
+        """Whether the worker has loaded the model."""
+        return self._ready
+
+    def _read_results(self):
+        """Resolve request futures from worker messages (runs in a thread)."""
+        process = self._process
+        while True:
+            try:
+                message = self._results.get(timeout=1)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                self.error = self.error or f"Embeddings worker exited with code {process.exitcode}"
+                logger.error(self.error)
+                break
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            kind, payload = message
+            if kind == "ready":
+                self._ready = True
+                logger.info(f"In-process embeddings model loaded - dimensions: {payload}")
+            elif kind == "failed":
+                self.error = payload
+                logger.error(f"In-process embeddings model failed to load: {payload}")
+                break
+            else:
+                self._loop.call_soon_threadsafe(self._complete, payload)
+        self._ready = False
+        self._loop.call_soon_threadsafe(self._fail_pending)
+
+    def _complete(self, done):
+        for slot, error in done:
+            future = self._pending.pop(slot, None)
+            if future is None or future.done():
+                self._free_slots.put_nowait(slot)
+            elif error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(None)
+
+    def _fail_pending(self):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(EmbeddingsUnavailableError("Embeddings worker stopped"))
+        self._pending.clear()
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text.
+
+        Raises:
+            EmbeddingsUnavailableError: If the model is not loaded (yet)
+        """
+        if not self._ready:
+            raise EmbeddingsUnavailableError(self.error or "Embeddings model not loaded")
+
+        slot = await self._free_slots.get()
+        future = self._loop.create_future()
+        self._pending[slot] = future
+        self._requests.put((slot, text))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The worker still owns the slot; _complete frees it when it finishes
+            raise
+        except BaseException:
+            self._free_slots.put_nowait(slot)
+            raise
+
+        offset = slot * self.dimensions * FLOAT32_BYTES
+        values = self._shm.buf[offset:offset + self.dimensions * FLOAT32_BYTES].cast("f").tolist()
+        self._free_slots.put_nowait(slot)
+        return values
+
+    async def shutdown(self):
+        """Stop the worker and release the shared memory."""
+        if self._process is None:
+            return
+        self._requests.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._process.join, 10)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._results.put(None)
+        self._process = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+def create_embeddings_backend():
+    """Backend selected by EMBEDDINGS_MODE."""
+    if settings.embeddings_mode == "inprocess":
+        return InProcessEmbeddings(
+            model_name=settings.embeddings_model,
+            dimensions=settings.embeddings_dimensions,
+            threads=max(1, settings.embeddings_threads),
+            slots=settings.embeddings_inprocess_slots,
+        )
+    return HttpEmbeddings(settings.embeddings_host, settings.embeddings_port)
+
+
+# Global embeddings backend
+embeddings_backend = create_embeddings_backend()
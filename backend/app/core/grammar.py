@@ -0,0 +1,129 @@
+"""GBNF grammars for structured (JSON) output."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from app.core.config import settings
+from app.api.middleware.metrics import GRAMMAR_CACHE_REQUESTS, GRAMMAR_COMPILE_LATENCY
+
+if TYPE_CHECKING:
+    from llama_cpp import LlamaGrammar
+
+JSON_MIME_TYPE = "application/json"
+
+
+class GrammarError(ValueError):
+    """Raised when a response schema cannot be compiled into a grammar."""
+
+
+def to_json_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Gemini ``responseSchema`` into plain JSON Schema.
+
+    Gemini uses an OpenAPI subset with upper-case types ("OBJECT", "STRING"),
+    ``nullable`` and ``propertyOrdering``; plain JSON Schema passes through.
+    """
+    result: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key == "type" and isinstance(value, str):
+            result["type"] = value.lower()
+        elif key == "properties" and isinstance(value, dict):
+            result["properties"] = {name: to_json_schema(prop) for name, prop in value.items()}
+        elif key in ("items", "additionalProperties") and isinstance(value, dict):
+            result[key] = to_json_schema(value)
+        elif key in ("anyOf", "oneOf", "allOf") and isinstance(value, list):
+            result[key] = [to_json_schema(item) for item in value]
+        elif key not in ("nullable", "propertyOrdering"):
+            result[key] = value
+
+    # Properties are emitted in dict order, so honour propertyOrdering
+    ordering = schema.get("propertyOrdering")
+    if ordering and "properties" in result:
+        properties = result["properties"]
+        ordered = {name: properties[name] for name in ordering if name in properties}
+        ordered.update((name, prop) for name, prop in properties.items() if name not in ordered)
+        result["properties"] = ordered
+
+    if schema.get("nullable"):
+        return {"anyOf": [result, {"type": "null"}]}
+    return result
+
+
+def schema_key(schema: Optional[Dict[str, Any]]) -> str:
+    """Stable cache key for a schema (``None`` means any JSON value)."""
+    if schema is None:
+        return "json"
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GrammarCache:
+    """Thread-safe LRU cache of parsed grammars keyed by schema hash.
+
+    Converting a schema into GBNF and parsing it into a ``LlamaGrammar``
+    takes milliseconds to tens of milliseconds for larger schemas;
+    extraction pipelines send the same few schemas over and over, so they
+    only pay that once. Cached grammars are shared templates: each decoded
+    sequence gets its own copy (see ``InferenceEngine._decode``).
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, LlamaGrammar]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, schema: Optional[Dict[str, Any]] = None) -> "LlamaGrammar":
+        """Return the parsed grammar for ``schema``, compiling it on a miss.
+
+        Args:
+            schema: Response schema, or None to allow any JSON value
+
+        Returns:
+            Parsed grammar, shared between requests (do not mutate)
+
+        Raises:
+            GrammarError: If the schema is not supported
+        """
+        key = schema_key(schema)
+        with self._lock:
+            grammar = self._entries.get(key)
+            if grammar is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                GRAMMAR_CACHE_REQUESTS.labels(result="hit").inc()
+                return grammar
+
+        with GRAMMAR_COMPILE_LATENCY.time():
+            grammar = self._compile(schema)
+
+        with self._lock:
+            self.misses += 1
+            GRAMMAR_CACHE_REQUESTS.labels(result="miss").inc()
+            self._entries[key] = grammar
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return grammar
+
+    @staticmethod
+    def _compile(schema: Optional[Dict[str, Any]]) -> "LlamaGrammar":
+        from llama_cpp import LlamaGrammar
+        from llama_cpp.llama_grammar import JSON_GBNF, json_schema_to_gbnf
+
+        try:
+            gbnf = JSON_GBNF if schema is None else json_schema_to_gbnf(json.dumps(to_json_schema(schema)))
+            return LlamaGrammar.from_string(gbnf, verbose=False)
+        except Exception as e:
+            raise GrammarError(f"Unsupported responseSchema: {e}") from e
+
+    def clear(self):
+        """Drop all cached grammars."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global grammar cache shared by all models (grammars are vocabulary-independent)
+grammar_cache = GrammarCache(settings.grammar_cache_size)
@@ -1,185 +1,667 @@
 """Inference engine using llama-cpp-python."""
 import asyncio
+import copy
 import logging
-from typing import AsyncGenerator, Optional, Dict, Any
+import os
+import threading
+import time
+from typing import AsyncGenerator, Callable, Optional, Dict, Any, List, Set, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor
-from llama_cpp import Llama
-from app.core.config import settings
+from llama_cpp import Llama, LlamaGrammar
+from app.core.config import ModelConfig, settings
+from app.core.budget import plan_context
+from app.core.tokenizer import Tokenizer
+from app.core.chat_template import ChatTemplate
+from app.models.schemas import Content
+from app.core.slots import Slot, SlotPool, estimate_kv_cache_bytes, ggml_type
+from app.core.streaming import StopMatcher, StreamChunk, TokenChannel, Utf8Detokenizer
+from app.core.cpu import SequenceLease, cpu_budget
+from app.core.scheduler import prefill_scheduler
+from app.api.middleware.metrics import KV_CACHE_BYTES, LLAMA_THREADS, CPU_BUDGET_SEQUENCES, TIME_TO_FIRST_TOKEN
 
 logger = logging.getLogger(__name__)
 
 
 class InferenceEngine:
-    """Manages model loading and inference with llama-cpp-python."""
+    """Manages loading and inference of a single GGUF model with llama-cpp-python."""
 
-    def __init__(self):
+    def __init__(self, config: ModelConfig, executor: ThreadPoolExecutor):
+        self.config = config
         self.model: Optional[Llama] = None
-        self.executor = ThreadPoolExecutor(max_workers=settings.max_concurrent_requests)
-        self._lock = asyncio.Lock()
+        self.slots: Optional[SlotPool] = None
+        self._eog_tokens: Set[int] = set()
+        self.executor = executor
+        self.tokenizer = Tokenizer(config.path, settings.token_cache_max_tokens)
+        self.chat_template = ChatTemplate(self.tokenizer)
+        self.active_requests = 0
+        self.last_used = 0.0
+        # Cancellation flags of running generations (for drain)
+        self._running: Set[threading.Event] = set()
+        self._cancel_new = False
+
+    @property
+    def name(self) -> str:
+        """Model name used for routing and metric labels."""
+        return self.config.name
+
+    def estimated_memory_bytes(self) -> int:
+        """Estimate resident memory of the model (weights plus all KV caches).
+
+        KV caches are estimated from the GGUF metadata for the full slot
+        layout, lazily created slots included, so the estimate is the same
+        before and after loading and the registry budgets for the worst case.
+        """
+        try:
+            weights = os.path.getsize(self.config.path)
+        except OSError:
+            return 0
+        try:
+            metadata = self.tokenizer.metadata()
+        except Exception as e:
+            logger.warning(f"Cannot read metadata of {self.name} for the KV cache estimate: {e}")
+            return weights
+        return weights + sum(
+            estimate_kv_cache_bytes(metadata, n_ctx, type_k, type_v)
+            for _, n_ctx, type_k, type_v, _ in self._slot_layout()
+        )
+
+    def _slot_layout(self) -> List[Tuple[str, int, str, str, bool]]:
+        """(pool, context size, K type, V type, lazy) for every slot to create.
+
+        Long slots are created lazily when there are small slots to serve
+        ordinary requests, so their KV cache exists only once a long prompt
+        (or fallback from a busy small pool) needs it.
+        """
+        layout = []
+        small = self.config.small_context_size
+        has_small = 0 < small < self.config.context_size and self.config.small_slots > 0
+        if has_small:
+            layout += [("small", small, self.config.type_k, self.config.type_v, False)] * self.config.small_slots
+        layout += [(
+            "long",
+            self.config.context_size,
+            self.config.long_type_k or self.config.type_k,
+            self.config.long_type_v or self.config.type_v,
+            has_small,
+        )] * self.config.long_slots
+        return layout
+
+    def _create_context(self, n_ctx: int, type_k: str, type_v: str) -> Llama:
+        return Llama(
+            model_path=self.config.path,
+            n_ctx=n_ctx,
+            n_threads=self.config.threads,
+            n_batch=self.config.batch_size,
+            n_gpu_layers=self.config.gpu_layers,
+            type_k=ggml_type(type_k),
+            type_v=ggml_type(type_v),
+            flash_attn=self.config.flash_attn,
+            verbose=False,
+        )
+
+    def _allocate_slot(self, slot: Slot):
+        """Create the context of a slot."""
+        slot.model = self._create_context(slot.context_size, slot.type_k, slot.type_v)
+        logger.info(
+            f"Slot {slot.index} ({slot.pool}): context {slot.context_size}, "
+            f"KV cache K={slot.type_k} V={slot.type_v} ~{slot.kv_cache_bytes / 1024**2:.0f} MiB"
+        )
+
+    def _report_kv_cache(self):
+        for pool_name in ("small", "long"):
+            KV_CACHE_BYTES.labels(model=self.name, pool=pool_name).set(
+                sum(s.kv_cache_bytes for s in self.slots.slots if s.pool == pool_name and s.allocated)
+                if self.slots is not None else 0
+            )
 
     def load_model(self):
-        """Load GGUF model into memory."""
-        logger.info(f"Loading model from {settings.model_path}")
-        logger.info(f"Context size: {settings.model_context_size}, Threads: {settings.model_threads}")
+        """Load GGUF model and create its (non-lazy) context slots."""
+        logger.info(f"Loading model {self.name} from {self.config.path}")
+        logger.info(
+            f"Context size: {self.config.context_size}, Threads: {self.config.threads}, "
+            f"KV cache: K={self.config.type_k} V={self.config.type_v}, "
+            f"flash attention: {self.config.flash_attn}"
+        )
+        layout = self._slot_layout()
+        if any(type_v != "f16" for _, _, _, type_v, _ in layout) and not self.config.flash_attn:
+            logger.warning("Quantized V cache requires flash attention in llama.cpp")
 
         try:
-            self.model = Llama(
-                model_path=settings.model_path,
-                n_ctx=settings.model_context_size,
-                n_threads=settings.model_threads,
-                n_batch=settings.model_batch_size,
-                n_gpu_layers=settings.model_gpu_layers,
-                verbose=False,
-            )
-            logger.info("Model loaded successfully")
+            metadata = self.tokenizer.metadata()
+            pool = SlotPool(fallback=self.config.slot_fallback)
+            for index, (pool_name, n_ctx, type_k, type_v, _) in enumerate(layout):
+                kv_bytes = estimate_kv_cache_bytes(metadata, n_ctx, type_k, type_v)
+                pool.slots.append(Slot(index, pool_name, n_ctx, type_k, type_v, kv_bytes))
+
+            for slot, (*_, lazy) in zip(pool.slots, layout):
+                if lazy:
+                    logger.info(
+                        f"Slot {slot.index} ({slot.pool}): context {slot.context_size}, "
+                        f"created on first use (~{slot.kv_cache_bytes / 1024**2:.0f} MiB)"
+                    )
+                else:
+                    self._allocate_slot(slot)
+
+            self.model = pool.slots[0].model
+            self._eog_tokens = self._end_of_generation_tokens(self.model)
+            # Publish the pool last: is_loaded() is true from here on
+            self.slots = pool
+            self._report_kv_cache()
+            self.last_used = time.monotonic()
+            logger.info(f"Model {self.name} loaded successfully")
         except Exception as e:
-            logger.error(f"Failed to load model: {e}")
+            self.model = None
+            logger.error(f"Failed to load model {self.name}: {e}")
             raise
 
+    def unload_model(self):
+        """Release the model contexts and their memory."""
+        if self.slots is not None:
+            logger.info(f"Unloading model {self.name}")
+            self.model = None
+            self.slots = None
+            self._report_kv_cache()
+
     def is_loaded(self) -> bool:
         """Check if model is loaded."""
-        return self.model is not None
+        return self.slots is not None
+
+    def slot_info(self) -> List[Dict[str, Any]]:
+        """Describe slots and their KV cache memory."""
+        if self.slots is None:
+            return []
+        return [
+            {
+                "index": slot.index,
+                "pool": slot.pool,
+                "contextSize": slot.context_size,
+                "kvCacheBytes": slot.kv_cache_bytes,
+                "allocated": slot.allocated,
+                "busy": slot.busy,
+            }
+            for slot in self.slots.slots
+        ]
+
+    def tokenize(self, prompt: str) -> List[int]:
+        """Tokenize a prompt the same way llama.cpp does for completions."""
+        return self.model.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+
+    def _prepare_prompt(
+        self,
+        contents: List[Content],
+        reserve_tokens: int,
+        policy: str,
+        keep_head_turns: int,
+    ) -> List[int]:
+        encoded = self.chat_template.encode(contents)
+
+        keep = plan_context(
+            [(role, len(tokens)) for role, tokens in encoded.turns],
+            context_size=self.slots.max_context_size,
+            reserve_tokens=reserve_tokens,
+            fixed_tokens=encoded.fixed_tokens,
+            policy=policy,
+            keep_head_turns=keep_head_turns,
+        )
+        if len(keep) < len(encoded.turns):
+            logger.info(f"Context budget: kept {len(keep)} of {len(encoded.turns)} turns ({policy})")
+
+        return encoded.token_ids(keep)
+
+    def _count_tokens(self, contents: List[Content]) -> int:
+        return len(self.chat_template.encode(contents))
+
+    async def count_tokens(self, contents: List[Content]) -> int:
+        """Count prompt tokens of a conversation as it would be sent to the model.
+
+        Uses the vocab-only tokenizer, so it neither loads the weights nor
+        waits for an inference slot.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._count_tokens, contents)
+
+    async def prepare_prompt(
+        self,
+        contents: List[Content],
+        reserve_tokens: int,
+        policy: Optional[str] = None,
+        keep_head_turns: Optional[int] = None,
+    ) -> List[int]:
+        """Tokenize a conversation and fit it into the context budget.
+
+        Each turn is tokenized separately by the chat template, so repeated
+        history is served from the token cache, and the resulting ids are
+        passed straight to ``generate``.
+
+        Raises:
+            ContextOverflowError: If the conversation does not fit
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Model not loaded")
+
+        # Tokenize outside the inference pool so budgeting never queues behind generation
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None,
+            self._prepare_prompt,
+            contents,
+            reserve_tokens,
+            policy or settings.context_overflow_policy,
+            keep_head_turns if keep_head_turns is not None else settings.context_keep_head_turns,
+        )
+
+    async def _acquire_slots(
+        self,
+        prompt_tokens: List[int],
+        max_tokens: int,
+        count: int = 1,
+        reserve_tokens: Optional[int] = None,
+    ) -> tuple[List[Slot], int]:
+        """Place a request by prompt length and clamp max_tokens to the slot.
+
+        The slot must fit the prompt plus ``reserve_tokens`` output tokens; by
+        default only the slot output reserve, so a default max_tokens is a
+        ceiling clamped to the chosen slot. For several candidates, free slots
+        of the same size are taken as well (without waiting) so candidates can
+        be decoded in parallel. Slots whose context does not exist yet are
+        created here.
+        """
+        reserve = reserve_tokens if reserve_tokens is not None else min(
+            max_tokens, self.config.output_reserve_tokens
+        )
+        slot = await self.slots.acquire(len(prompt_tokens) + reserve)
+        slots = [slot]
+        while len(slots) < count:
+            extra = await self.slots.try_acquire(slot.context_size)
+            if extra is None:
+                break
+            slots.append(extra)
+
+        loop = asyncio.get_event_loop()
+        try:
+            for acquired in slots:
+                if not acquired.allocated:
+                    await loop.run_in_executor(self.executor, self._allocate_slot, acquired)
+                    self._report_kv_cache()
+        except BaseException:
+            await self._release_slots(slots)
+            raise
+        return slots, min(max_tokens, slot.context_size - len(prompt_tokens))
+
+    async def _release_slots(self, slots: List[Slot]):
+        for slot in slots:
+            await self.slots.release(slot)
+
+    def _prefill(
+        self,
+        slot: Slot,
+        prompt_tokens: List[int],
+        cancelled: threading.Event,
+        lease: Optional[SequenceLease] = None,
+    ):
+        """Evaluate all but the last prompt token, reusing the cached prefix.
+
+        The uncached part is evaluated in chunks admitted by the prefill
+        scheduler, so long prompts interleave with other sequences and can be
+        cancelled between chunks. ``Llama.generate`` recognises the evaluated
+        prefix and only runs the last token, which also yields the logits for
+        the first sample.
+        """
+        model = slot.model
+        prefix = 0
+        for cached, token in zip(model._input_ids, prompt_tokens[:-1]):
+            if cached != token:
+                break
+            prefix += 1
+        model.n_tokens = prefix
+
+        end = len(prompt_tokens) - 1
+        with prefill_scheduler.long_prefill(end - prefix):
+            while prefix < end and not cancelled.is_set():
+                with prefill_scheduler.chunk(end - prefix) as n_tokens:
+                    if lease is not None:
+                        self._apply_threads(lease, slot)
+                    model.eval(prompt_tokens[prefix:prefix + n_tokens])
+                prefix += n_tokens
+
+    def _apply_threads(self, lease: SequenceLease, slot: Slot):
+        """Re-apply the CPU budget to a slot when concurrency has changed."""
+        if not settings.cpu_budget_enabled:
+            return
+        threads = lease.apply(slot.model)
+        if threads:
+            CPU_BUDGET_SEQUENCES.set(cpu_budget.active)
+            for phase, count in threads.items():
+                LLAMA_THREADS.labels(phase=phase).set(count)
+
+    def _fork(
+        self,
+        slots: List[Slot],
+        prompt_tokens: List[int],
+        cancelled: threading.Event,
+        lease: Optional[SequenceLease] = None,
+    ):
+        """Evaluate the prompt once and copy its KV state to the other slots."""
+        self._prefill(slots[0], prompt_tokens, cancelled, lease)
+        if len(slots) > 1 and not cancelled.is_set():
+            state = slots[0].model.save_state()
+            for slot in slots[1:]:
+                slot.model.load_state(state)
+
+    def _run_candidates(
+        self,
+        slots: List[Slot],
+        prompt_tokens: List[int],
+        candidate_count: int,
+        sampling: Dict[str, Any],
+        emit: Callable[[int, str], None],
+        finish: Callable[[int, int, str], None],
+        cancelled: threading.Event,
+        on_first_token: Optional[Callable[[], None]] = None,
+    ):
+        """Fork the prompt into the slots and decode all candidates in parallel.
+
+        Candidates are spread round-robin over the slots; further candidates on
+        the same slot restart from the shared prompt prefix in its KV cache.
+        Runs in a worker thread and blocks until every candidate is done.
+        """
+        with cpu_budget.sequence(self.config.threads) as lease:
+            self._apply_threads(lease, slots[0])
+            self._fork(slots, prompt_tokens, cancelled, lease)
+
+        errors: List[BaseException] = []
+
+        def _run(k: int, slot: Slot):
+            try:
+                with cpu_budget.sequence(self.config.threads) as lease:
+                    for index in range(k, candidate_count, len(slots)):
+                        completion_tokens, finish_reason = self._decode(
+                            slot, prompt_tokens, emit=lambda text, i=index: emit(i, text),
+                            cancelled=cancelled, lease=lease,
+                            on_first_token=on_first_token if index == 0 else None,
+                            **sampling,
+                        )
+                        finish(index, completion_tokens, finish_reason)
+            except Exception as e:
+                errors.append(e)
+                cancelled.set()
+
+        # The calling worker decodes on the first slot, extra slots get threads
+        threads = [
+            threading.Thread(target=_run, args=(k, slot), name=f"{self.name}-slot{slot.index}", daemon=True)
+            for k, slot in enumerate(slots[1:], start=1)
+        ]
+        for thread in threads:
+            thread.start()
+        _run(0, slots[0])
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def _end_of_generation_tokens(self, model: Llama) -> Set[int]:
+        """EOS plus Gemma's <end_of_turn>, which ends a model turn."""
+        tokens = {model.token_eos()}
+        tokens.update(model.tokenize(b"<end_of_turn>", add_bos=False, special=True))
+        return tokens
+
+    def _decode(
+        self,
+        slot: Slot,
+        prompt_tokens: List[int],
+        max_tokens: int,
+        temperature: float,
+        top_k: int,
+        top_p: float,
+        stop: Optional[list[str]],
+        emit: Callable[[str], None],
+        cancelled: threading.Event,
+        lease: Optional[SequenceLease] = None,
+        on_first_token: Optional[Callable[[], None]] = None,
+        grammar: Optional[LlamaGrammar] = None,
+    ) -> Tuple[int, str]:
+        """Run prompt evaluation and decoding on a slot (in a worker thread).
+
+        Generated text is passed to ``emit`` in UTF-8 safe pieces with stop
+        sequences removed. With a ``grammar`` only tokens it accepts are
+        sampled; once it is complete only end-of-generation tokens remain.
+        The grammar is a shared, already parsed template from
+        ``grammar_cache``; the sequence decodes with its own copy.
+
+        Returns:
+            (completion tokens, Gemini finish reason)
+        """
+        detokenizer = Utf8Detokenizer(slot.model)
+        stop_matcher = StopMatcher(stop)
+        completion_tokens = 0
+        finish_reason = "MAX_TOKENS"
+
+        if cancelled.is_set():
+            return 0, "OTHER"
+        if lease is not None:
+            self._apply_threads(lease, slot)
+
+        if max_tokens > 0:
+            with prefill_scheduler.decoding_sequence():
+                tokens = slot.model.generate(
+                    prompt_tokens, top_k=top_k, top_p=top_p, temp=temperature,
+                    grammar=copy.copy(grammar) if grammar is not None else None,
+                )
+                for token in tokens:
+                    if cancelled.is_set():
+                        finish_reason = "OTHER"
+                        break
+                    if lease is not None:
+                        # Thread counts follow concurrency changes between steps
+                        self._apply_threads(lease, slot)
+                    if token in self._eog_tokens:
+                        finish_reason = "STOP"
+                        break
+
+                    completion_tokens += 1
+                    if completion_tokens == 1 and on_first_token is not None:
+                        on_first_token()
+                    text, stopped = stop_matcher.feed(detokenizer.feed(token))
+                    if text:
+                        emit(text)
+                    if stopped:
+                        return completion_tokens, "STOP"
+                    if completion_tokens >= max_tokens:
+                        break
+
+        emit(stop_matcher.feed(detokenizer.flush())[0] + stop_matcher.flush())
+        return completion_tokens, finish_reason
+
+    def _ttft_observer(self, prompt_tokens: List[int]) -> Callable[[], None]:
+        """Return a callback that records time to first token from now.
+
+        Observations are split by prompt class and by whether a long prefill
+        was running, to show whether long prompts delay short ones.
+        """
+        start = time.monotonic()
+        prompt_class = "long" if len(prompt_tokens) >= settings.long_prompt_tokens else "short"
+
+        def _observe():
+            TIME_TO_FIRST_TOKEN.labels(
+                model=self.config.name,
+                prompt_class=prompt_class,
+                long_prefill_running=str(prefill_scheduler.long_prefills > 0).lower(),
+            ).observe(time.monotonic() - start)
+
+        return _observe
 
     async def generate(
         self,
-        prompt: str,
+        prompt: Union[str, List[int]],
         temperature: float = 0.3,
         max_tokens: int = 8192,
         top_k: int = 40,
         top_p: float = 0.95,
         stop: Optional[list[str]] = None,
+        candidate_count: int = 1,
+        grammar: Optional[LlamaGrammar] = None,
+        reserve_tokens: Optional[int] = None,
     ) -> Dict[str, Any]:
         """Generate text synchronously.
 
+        Args:
+            prompt: Prompt string or token ids from ``prepare_prompt``
+            candidate_count: Number of candidates sharing one prompt evaluation
+            grammar: Parsed grammar constraining the output (see ``grammar_cache``)
+            reserve_tokens: Output tokens the slot must fit (the reserve the
+                prompt was budgeted with); an explicit max_tokens is passed
+                here so it is not clamped
+
         Returns:
-            Dict with 'text', 'prompt_tokens', 'completion_tokens', 'total_tokens'
+            Dict with 'candidates' (each with 'text', 'finish_reason',
+            'completion_tokens'), 'prompt_tokens', 'completion_tokens', 'total_tokens'
         """
         if not self.is_loaded():
             raise RuntimeError("Model not loaded")
 
         loop = asyncio.get_event_loop()
-
-        # Run inference in thread pool
-        def _generate():
-            response = self.model(
-                prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_k=top_k,
-                top_p=top_p,
-                stop=stop or [],
-                echo=False,
+        tokens = prompt if isinstance(prompt, list) else await loop.run_in_executor(
+            self.executor, self.tokenize, prompt
+        )
+        on_first_token = self._ttft_observer(tokens)
+        slots, max_tokens = await self._acquire_slots(tokens, max_tokens, candidate_count, reserve_tokens)
+        sampling = dict(
+            max_tokens=max_tokens, temperature=temperature, top_k=top_k, top_p=top_p, stop=stop, grammar=grammar
+        )
+        pieces: List[List[str]] = [[] for _ in range(candidate_count)]
+        candidates: List[Dict[str, Any]] = [{} for _ in range(candidate_count)]
+
+        def _finish(index: int, completion_tokens: int, finish_reason: str):
+            candidates[index].update(
+                text="".join(pieces[index]),
+                finish_reason=finish_reason,
+                completion_tokens=completion_tokens,
             )
-            return response
 
-        response = await loop.run_in_executor(self.executor, _generate)
-
-        # Extract results
-        text = response["choices"][0]["text"]
-        usage = response.get("usage", {})
+        cancelled = threading.Event()
+        if self._cancel_new:
+            cancelled.set()
+        self._running.add(cancelled)
+        try:
+            await loop.run_in_executor(
+                self.executor,
+                self._run_candidates,
+                slots, tokens, candidate_count, sampling,
+                lambda index, text: pieces[index].append(text),
+                _finish,
+                cancelled,
+                on_first_token,
+            )
+        finally:
+            self._running.discard(cancelled)
+            await self._release_slots(slots)
 
+        completion_tokens = sum(c["completion_tokens"] for c in candidates)
         return {
-            "text": text,
-            "prompt_tokens": usage.get("prompt_tokens", 0),
-            "completion_tokens": usage.get("completion_tokens", 0),
-            "total_tokens": usage.get("total_tokens", 0),
+            "candidates": candidates,
+            "prompt_tokens": len(tokens),
+            "completion_tokens": completion_tokens,
+            "total_tokens": len(tokens) + completion_tokens,
         }
 
     async def generate_stream(
         self,
-        prompt: str,
+        prompt: Union[str, List[int]],
         temperature: float = 0.3,
         max_tokens: int = 8192,
         top_k: int = 40,
         top_p: float = 0.95,
         stop: Optional[list[str]] = None,
-    ) -> AsyncGenerator[str, None]:
+        candidate_count: int = 1,
+        grammar: Optional[LlamaGrammar] = None,
+        reserve_tokens: Optional[int] = None,
+    ) -> AsyncGenerator[StreamChunk, None]:
         """Generate text with streaming.
 
+        Tokens are coalesced per flush (STREAM_FLUSH_TOKENS or
+        STREAM_FLUSH_INTERVAL_MS) to limit event loop wake-ups and SSE frames.
+
+        Args:
+            prompt: Prompt string or token ids from ``prepare_prompt``
+            candidate_count: Number of candidates sharing one prompt evaluation
+            grammar: Parsed grammar constraining the output (see ``grammar_cache``)
+            reserve_tokens: Output tokens the slot must fit (the reserve the
+                prompt was budgeted with); an explicit max_tokens is passed
+                here so it is not clamped
+
         Yields:
-            Text chunks as they are generated
+            Text chunks interleaved by candidate index; the last chunk of each
+            candidate has finish_reason set
         """
         if not self.is_loaded():
             raise RuntimeError("Model not loaded")
 
-        # Create a queue for streaming
-        queue: asyncio.Queue = asyncio.Queue()
         loop = asyncio.get_event_loop()
+        tokens = prompt if isinstance(prompt, list) else await loop.run_in_executor(
+            self.executor, self.tokenize, prompt
+        )
+        on_first_token = self._ttft_observer(tokens)
+        slots, max_tokens = await self._acquire_slots(tokens, max_tokens, candidate_count, reserve_tokens)
+        sampling = dict(
+            max_tokens=max_tokens, temperature=temperature, top_k=top_k, top_p=top_p, stop=stop, grammar=grammar
+        )
+        channel = TokenChannel(
+            loop,
+            flush_tokens=settings.stream_flush_tokens,
+            flush_interval=settings.stream_flush_interval_ms / 1000,
+        )
+        cancelled = threading.Event()
 
         def _generate_stream():
             """Run streaming in thread."""
             try:
-                stream = self.model(
-                    prompt,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    top_k=top_k,
-                    top_p=top_p,
-                    stop=stop or [],
-                    echo=False,
-                    stream=True,
+                self._run_candidates(
+                    slots, tokens, candidate_count, sampling,
+                    lambda index, text: channel.put(text, index),
+                    lambda index, _, finish_reason: channel.finish(index, finish_reason),
+                    cancelled,
+                    on_first_token,
                 )
-
-                for chunk in stream:
-                    text = chunk["choices"][0]["text"]
-                    asyncio.run_coroutine_threadsafe(queue.put(text), loop)
-
+                channel.close()
             except Exception as e:
                 logger.error(f"Streaming error: {e}")
-                asyncio.run_coroutine_threadsafe(queue.put(None), loop)
-            finally:
-                asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+                channel.close(error=e)
 
         # Start streaming in background
-        loop.run_in_executor(self.executor, _generate_stream)
-
-        # Yield chunks
-        while True:
-            chunk = await queue.get()
-            if chunk is None:
-                break
-            yield chunk
-
-    def format_chat_prompt(self, contents: list[Dict[str, Any]]) -> str:
-        """Format chat messages into a prompt for Gemma model.
+        if self._cancel_new:
+            cancelled.set()
+        self._running.add(cancelled)
+        producer = loop.run_in_executor(self.executor, _generate_stream)
 
-        Gemma-3 uses a specific format:
-        <start_of_turn>user
-        message<end_of_turn>
-        <start_of_turn>model
-        response<end_of_turn>
-        """
-        prompt_parts = []
-
-        for content in contents:
-            role = content.get("role", "user")
-            parts = content.get("parts", [])
+        # Yield chunks; slots are released only after the producer stops
+        try:
+            async for chunk in channel:
+                yield chunk
+        finally:
+            cancelled.set()
+            await producer
+            self._running.discard(cancelled)
+            await self._release_slots(slots)
 
-            # Extract text from parts
-            text = ""
-            for part in parts:
-                if isinstance(part, dict) and "text" in part:
-                    text += part["text"]
+    def cancel_all(self) -> int:
+        """Cancel running generations; they stop at the next token.
 
-            # Format according to Gemma template
-            if role == "user":
-                prompt_parts.append(f"<start_of_turn>user\n{text}<end_of_turn>")
-            elif role == "model":
-                prompt_parts.append(f"<start_of_turn>model\n{text}<end_of_turn>")
+        Generations still waiting for a slot are cancelled as soon as they start.
 
-        # Add model turn start for generation
-        prompt_parts.append("<start_of_turn>model\n")
+        Returns:
+            Number of generations cancelled
+        """
+        self._cancel_new = True
+        running = list(self._running)
+        for cancelled in running:
+            cancelled.set()
+        return len(running)
 
-        return "\n".join(prompt_parts)
+    def format_chat_prompt(self, contents: List[Content]) -> str:
+        """Format chat messages into a prompt string for Gemma model."""
+        return self.chat_template.render(contents)
 
     def shutdown(self):
         """Cleanup resources."""
-        logger.info("Shutting down inference engine")
-        self.executor.shutdown(wait=True)
-        if self.model:
-            del self.model
-            self.model = None
-
-
-# Global inference engine instance
-inference_engine = InferenceEngine()
+        logger.info(f"Shutting down inference engine for {self.name}")
+        self.unload_model()
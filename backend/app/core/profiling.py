@@ -0,0 +1,214 @@
+"""On-demand profiling of the serving process.
+
+Nothing here runs until an admin endpoint asks for it: the stack sampler is a
+thread started for the duration of one profile and tracemalloc is only traced
+for the duration of one memory snapshot, so there is no overhead otherwise.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+ProfileMode = Literal["wall", "cpu"]
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile of the same kind is already running."""
+
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+def _thread_cpu_ns(ident: int) -> Optional[int]:
+    try:
+        return time.clock_gettime_ns(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, mode: ProfileMode = "wall") -> str:
+    """Sample all Python thread stacks and return them as collapsed stacks.
+
+    The output is Brendan Gregg's collapsed format (``frame;frame;frame count``),
+    usable directly by flamegraph.pl, speedscope or inferno.
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+        mode: "wall" counts samples of every thread, blocked or not; "cpu"
+            weights each stack by the thread's CPU time (in microseconds) since
+            the previous sample, so idle and waiting threads drop out and
+            native llama.cpp work is attributed to the Python call that
+            entered it
+
+    Raises:
+        ProfilerBusyError: If another stack profile is running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        own = threading.get_ident()
+        counts: Counter = Counter()
+        last_cpu: Dict[int, int] = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                weight = 1
+                if mode == "cpu":
+                    cpu = _thread_cpu_ns(ident)
+                    if cpu is None:
+                        continue
+                    weight = (cpu - last_cpu.get(ident, cpu)) // 1000
+                    last_cpu[ident] = cpu
+                    if weight <= 0:
+                        continue
+                counts[_collapse(frame, names.get(ident, f"thread-{ident}"))] += weight
+            # Do not keep other threads' frames alive while sleeping
+            del frames, frame
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+    finally:
+        _profile_lock.release()
+
+
+def _set_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
+
+
+async def run_in_thread(fn: Callable[..., Any], *args) -> Any:
+    """Run ``fn`` in a dedicated daemon thread and await its result.
+
+    Profiles run for many seconds, so they get their own thread rather than
+    occupying a worker of the default executor used for tokenization.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _run():
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            # Pass the exception itself: ``e`` is unbound once the except block ends
+            loop.call_soon_threadsafe(_set_exception, future, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, result)
+
+    threading.Thread(target=_run, name="profiler", daemon=True).start()
+    return await future
+
+
+def dump_tasks(limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+    """Describe running asyncio tasks and thread stacks.
+
+    Must be called from the event loop thread.
+
+    Args:
+        limit: Maximum stack frames per task
+    """
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coro": getattr(coro, "__qualname__", repr(coro)),
+            "done": task.done(),
+            "stack": [
+                line.rstrip("\n")
+                for frame in task.get_stack(limit=limit)
+                for line in traceback.format_stack(frame, limit=1)
+            ],
+        })
+
+    names = {t.ident: (t.name, t.daemon) for t in threading.enumerate()}
+    threads = []
+    for ident, frame in sys._current_frames().items():
+        name, daemon = names.get(ident, (f"thread-{ident}", None))
+        threads.append({
+            "name": name,
+            "ident": ident,
+            "daemon": daemon,
+            "stack": [line.rstrip("\n") for line in traceback.format_stack(frame)],
+        })
+    return {"tasks": tasks, "threads": threads}
+
+
+def memory_top(seconds: float, top: int = 25, frames: int = 1, key_type: str = "lineno") -> Dict[str, Any]:
+    """Trace allocations for ``seconds`` and return the top-N live allocation sites.
+
+    If tracemalloc is already tracing (e.g. PYTHONTRACEMALLOC is set) a
+    snapshot is taken right away and tracing is left on.
+
+    Args:
+        seconds: How long to trace before the snapshot
+        top: Number of allocation sites to return
+        frames: Traceback depth recorded per allocation
+        key_type: Grouping: "lineno", "filename" or "traceback"
+
+    Raises:
+        ProfilerBusyError: If another memory snapshot is running
+    """
+    if not _memory_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A memory snapshot is already running")
+    try:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(frames)
+            time.sleep(seconds)
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        stats = snapshot.statistics(key_type)
+        return {
+            "traced_seconds": seconds if started else None,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": [
+                {
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                    "traceback": stat.traceback.format(),
+                }
+                for stat in stats[:top]
+            ],
+        }
+    finally:
+        _memory_lock.release()
@@ -0,0 +1,268 @@
+"""Model registry serving several GGUF models from one process."""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import ModelConfig, settings
+from app.core.inference import InferenceEngine
+from app.api.middleware.metrics import (
+    DRAIN_CANCELLED_REQUESTS,
+    DRAIN_IN_FLIGHT_REQUESTS,
+    DRAINING,
+    MODEL_ACTIVE_REQUESTS,
+    MODEL_EVICTIONS,
+    MODEL_LOAD_LATENCY,
+    MODEL_LOADED,
+    MODEL_MEMORY_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotFoundError(LookupError):
+    """Requested model is not configured."""
+
+
+class ModelBudgetExceededError(RuntimeError):
+    """Model cannot be loaded without exceeding the memory budget."""
+
+
+class DrainingError(RuntimeError):
+    """Server is draining and does not admit new work."""
+
+
+class ModelLoadError(RuntimeError):
+    """Model failed to load (e.g. missing or corrupt GGUF file)."""
+
+
+class ModelRegistry:
+    """Routes requests to per-model inference engines.
+
+    Models are loaded lazily on first use (or at startup when ``preload`` is
+    set). When a memory budget is configured, least recently used idle models
+    are unloaded to make room for the requested one.
+    """
+
+    def __init__(self, configs: List[ModelConfig], memory_budget_bytes: int = 0):
+        self.executor = ThreadPoolExecutor(max_workers=settings.max_concurrent_requests)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.engines: Dict[str, InferenceEngine] = {
+            config.name: InferenceEngine(config, self.executor) for config in configs
+        }
+        self.default_model = configs[0].name
+        # Models whose last load attempt failed, with the error; they are
+        # retried on use once their backoff (monotonic retry time) has passed
+        self.load_errors: Dict[str, str] = {}
+        self._load_failures: Dict[str, int] = {}
+        self._load_retry_at: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self.draining = False
+        self._drain_task: Optional[asyncio.Task] = None
+        self._drain_deadline = 0.0
+
+    def names(self) -> List[str]:
+        """Names of all configured models."""
+        return list(self.engines)
+
+    def get(self, name: str) -> InferenceEngine:
+        """Return the engine for a model, loaded or not."""
+        try:
+            return self.engines[name]
+        except KeyError:
+            raise ModelNotFoundError(f"Model '{name}' not found") from None
+
+    def is_loaded(self, name: str) -> bool:
+        """Check if a model is configured and loaded."""
+        return name in self.engines and self.engines[name].is_loaded()
+
+    def load_error(self, name: str) -> Optional[str]:
+        """Error of the last failed load of a model, if it failed.
+
+        Evicted models are not failed: they are reloaded on next use.
+        """
+        return self.load_errors.get(name)
+
+    def load_retry_in(self, name: str) -> float:
+        """Seconds until a failed model may be loaded again (0 = now)."""
+        return max(0.0, self._load_retry_at.get(name, 0.0) - time.monotonic())
+
+    def loaded_models(self) -> List[str]:
+        """Names of currently loaded models."""
+        return [name for name, engine in self.engines.items() if engine.is_loaded()]
+
+    def _loaded_memory_bytes(self) -> int:
+        return sum(e.estimated_memory_bytes() for e in self.engines.values() if e.is_loaded())
+
+    def _make_room(self, engine: InferenceEngine):
+        """Unload LRU idle models until ``engine`` fits in the memory budget."""
+        if not self.memory_budget_bytes:
+            return
+
+        needed = engine.estimated_memory_bytes()
+        candidates = sorted(
+            (e for e in self.engines.values() if e.is_loaded() and e is not engine),
+            key=lambda e: e.last_used,
+        )
+        for candidate in candidates:
+            if self._loaded_memory_bytes() + needed <= self.memory_budget_bytes:
+                return
+            if candidate.active_requests > 0:
+                continue
+            logger.info(f"Evicting model {candidate.name} to fit {engine.name} in memory budget")
+            self._unload(candidate)
+            MODEL_EVICTIONS.labels(model=candidate.name).inc()
+
+        if self._loaded_memory_bytes() + needed > self.memory_budget_bytes:
+            raise ModelBudgetExceededError(
+                f"Not enough memory budget to load model '{engine.name}'"
+            )
+
+    def _load(self, engine: InferenceEngine):
+        start_time = time.time()
+        try:
+            engine.load_model()
+        except Exception as e:
+            # Exponential backoff, so a missing file is not retried per request
+            failures = self._load_failures.get(engine.name, 0) + 1
+            delay = min(
+                settings.model_load_retry_seconds * 2 ** (failures - 1),
+                settings.model_load_retry_max_seconds,
+            )
+            self._load_failures[engine.name] = failures
+            self._load_retry_at[engine.name] = time.monotonic() + delay
+            self.load_errors[engine.name] = str(e)
+            logger.warning(f"Model {engine.name} failed to load {failures} time(s), retrying in {delay:.0f}s")
+            raise ModelLoadError(f"Model '{engine.name}' failed to load: {e}") from e
+        self.load_errors.pop(engine.name, None)
+        self._load_failures.pop(engine.name, None)
+        self._load_retry_at.pop(engine.name, None)
+        MODEL_LOAD_LATENCY.labels(model=engine.name).observe(time.time() - start_time)
+        MODEL_LOADED.labels(model=engine.name).set(1)
+        MODEL_MEMORY_BYTES.labels(model=engine.name).set(engine.estimated_memory_bytes())
+
+    def _unload(self, engine: InferenceEngine):
+        engine.unload_model()
+        MODEL_LOADED.labels(model=engine.name).set(0)
+        MODEL_MEMORY_BYTES.labels(model=engine.name).set(0)
+
+    def load_preloaded(self):
+        """Load models marked for preloading (called on startup)."""
+        for engine in self.engines.values():
+            MODEL_LOADED.labels(model=engine.name).set(0)
+            if engine.config.preload:
+                self._make_room(engine)
+                self._load(engine)
+
+    async def acquire(self, name: str) -> InferenceEngine:
+        """Return a loaded engine for ``name``, loading it if necessary.
+
+        Raises:
+            ModelLoadError: If loading fails, or failed recently and its retry
+                backoff has not passed yet
+        """
+        engine = self.get(name)
+        if engine.is_loaded():
+            return engine
+
+        async with self._lock:
+            if not engine.is_loaded():
+                retry_in = self.load_retry_in(name)
+                if retry_in > 0:
+                    raise ModelLoadError(
+                        f"Model '{name}' failed to load: {self.load_errors.get(name)} "
+                        f"(retrying in {retry_in:.0f}s)"
+                    )
+                self._make_room(engine)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._load, engine)
+        return engine
+
+    @asynccontextmanager
+    async def use(self, name: str) -> AsyncIterator[InferenceEngine]:
+        """Acquire an engine and mark it busy so it is not evicted while in use.
+
+        New work is refused while draining; hold one ``use()`` for the whole
+        request, streaming included, so a drain waits for it.
+        """
+        if self.draining:
+            raise DrainingError("Server is draining, retry on another instance")
+        engine = await self.acquire(name)
+        engine.active_requests += 1
+        engine.last_used = time.monotonic()
+        MODEL_ACTIVE_REQUESTS.labels(model=name).inc()
+        try:
+            yield engine
+        finally:
+            engine.active_requests -= 1
+            engine.last_used = time.monotonic()
+            MODEL_ACTIVE_REQUESTS.labels(model=name).dec()
+
+    def in_flight(self) -> int:
+        """Number of requests currently using any model."""
+        return sum(engine.active_requests for engine in self.engines.values())
+
+    def drain_status(self) -> Dict[str, Any]:
+        """Drain progress for the admin API."""
+        remaining = 0.0
+        if self.draining:
+            remaining = max(0.0, self._drain_deadline - asyncio.get_running_loop().time())
+        return {
+            "draining": self.draining,
+            "inFlight": self.in_flight(),
+            "deadlineRemainingSeconds": round(remaining, 1),
+            "done": self._drain_task is not None and self._drain_task.done(),
+        }
+
+    def start_drain(self, timeout: float) -> asyncio.Task:
+        """Stop admitting work and start draining in the background (idempotent)."""
+        if self._drain_task is None:
+            self.draining = True
+            DRAINING.set(1)
+            self._drain_deadline = asyncio.get_running_loop().time() + timeout
+            logger.info(f"Draining: {self.in_flight()} in-flight requests, deadline {timeout:.0f}s")
+            self._drain_task = asyncio.create_task(self._drain())
+        return self._drain_task
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        last_logged = 0.0
+        while self.in_flight() and loop.time() < self._drain_deadline:
+            DRAIN_IN_FLIGHT_REQUESTS.set(self.in_flight())
+            if loop.time() - last_logged >= 5:
+                remaining = self._drain_deadline - loop.time()
+                logger.info(f"Draining: {self.in_flight()} in flight, {remaining:.0f}s to deadline")
+                last_logged = loop.time()
+            await asyncio.sleep(0.2)
+
+        if self.in_flight():
+            cancelled = sum(engine.cancel_all() for engine in self.engines.values())
+            DRAIN_CANCELLED_REQUESTS.inc(cancelled)
+            logger.warning(f"Drain deadline reached, cancelled {cancelled} generations")
+            # Cancelled generations stop at the next token and send their final chunk
+            while self.in_flight():
+                DRAIN_IN_FLIGHT_REQUESTS.set(self.in_flight())
+                await asyncio.sleep(0.1)
+
+        DRAIN_IN_FLIGHT_REQUESTS.set(0)
+        logger.info("Drain complete")
+
+    async def drain(self, timeout: float):
+        """Drain and wait until all in-flight requests have finished."""
+        await self.start_drain(timeout)
+
+    def shutdown(self):
+        """Unload all models and stop the worker pool."""
+        logger.info("Shutting down model registry")
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for engine in self.engines.values():
+            engine.shutdown()
+
+
+# Global model registry instance
+model_registry = ModelRegistry(
+    settings.model_configs(),
+    memory_budget_bytes=int(settings.models_memory_budget_gb * 1024**3),
+)
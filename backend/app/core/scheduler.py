@@ -0,0 +1,102 @@
+"""Chunked prefill scheduling across all context slots.
+
+Long prompts are evaluated in bounded chunks. Each chunk has to fit into a
+per-step token budget shared by the whole process, from which running
+decoders are subtracted, and waiting chunks are admitted shortest remaining
+prompt first. A short request arriving behind a 100k-token prefill therefore
+waits for at most one chunk instead of the whole prompt, and decode steps of
+other sequences keep running alongside.
+"""
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from app.core.config import settings
+from app.api.middleware.metrics import LONG_PREFILLS_IN_PROGRESS, PREFILL_QUEUE_DEPTH
+
+
+class PrefillScheduler:
+    """Admits prefill chunks under a shared per-step token budget."""
+
+    def __init__(self, step_token_budget: int, chunk_tokens: int, long_prompt_tokens: int):
+        self.step_token_budget = step_token_budget
+        self.chunk_tokens = chunk_tokens
+        self.long_prompt_tokens = long_prompt_tokens
+        self.prefill_in_flight = 0
+        self.decoding = 0
+        self.long_prefills = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _available(self) -> int:
+        return self.step_token_budget - self.decoding - self.prefill_in_flight
+
+    @contextmanager
+    def chunk(self, remaining: int) -> Iterator[int]:
+        """Wait for budget for the next chunk of a prompt.
+
+        Args:
+            remaining: Prompt tokens this sequence still has to evaluate
+
+        Yields:
+            Number of tokens to evaluate in this chunk
+        """
+        entry = (remaining, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            PREFILL_QUEUE_DEPTH.set(len(self._waiting))
+            # Shortest remaining prompt first; always let one chunk through
+            # when nothing is prefilling so progress is guaranteed
+            while self._waiting[0] != entry or (self._available() <= 0 and self.prefill_in_flight):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            PREFILL_QUEUE_DEPTH.set(len(self._waiting))
+
+            granted = min(remaining, self.chunk_tokens, max(self._available(), self.chunk_tokens // 8, 1))
+            self.prefill_in_flight += granted
+            self._cond.notify_all()
+        try:
+            yield granted
+        finally:
+            with self._cond:
+                self.prefill_in_flight -= granted
+                self._cond.notify_all()
+
+    @contextmanager
+    def long_prefill(self, n_tokens: int) -> Iterator[None]:
+        """Track prompts long enough to delay others (for fairness metrics)."""
+        is_long = n_tokens >= self.long_prompt_tokens
+        if is_long:
+            with self._cond:
+                self.long_prefills += 1
+                LONG_PREFILLS_IN_PROGRESS.set(self.long_prefills)
+        try:
+            yield
+        finally:
+            if is_long:
+                with self._cond:
+                    self.long_prefills -= 1
+                    LONG_PREFILLS_IN_PROGRESS.set(self.long_prefills)
+
+    @contextmanager
+    def decoding_sequence(self) -> Iterator[None]:
+        """Count a decoding sequence against the step budget."""
+        with self._cond:
+            self.decoding += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.decoding -= 1
+                self._cond.notify_all()
+
+
+# Global prefill scheduler shared by all models and slots
+prefill_scheduler = PrefillScheduler(
+    step_token_budget=settings.step_token_budget,
+    chunk_tokens=settings.prefill_chunk_tokens,
+    long_prompt_tokens=settings.long_prompt_tokens,
+)
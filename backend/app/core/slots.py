@@ -0,0 +1,156 @@
+"""Context slots: independent llama.cpp contexts sharing one set of weights.
+
+Each slot owns its own KV cache sized for its pool. Ordinary requests run in
+small-context slots and only long prompts are placed in the long-context pool,
+so the full-size KV cache is allocated once instead of per concurrent request.
+Long slots are created lazily, on the first request that needs one, and may
+use a quantized KV cache. Weights are memory-mapped, so all slots of a model
+share them.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import llama_cpp
+from llama_cpp import Llama
+
+logger = logging.getLogger(__name__)
+
+# Bytes per element of supported KV cache types (block size 32 for quants)
+KV_TYPE_BYTES: Dict[str, float] = {
+    "f32": 4.0,
+    "f16": 2.0,
+    "q8_0": 34 / 32,
+    "q5_1": 24 / 32,
+    "q5_0": 22 / 32,
+    "q4_1": 20 / 32,
+    "q4_0": 18 / 32,
+}
+
+
+def ggml_type(name: str) -> int:
+    """Map a KV cache type name (e.g. 'q8_0') to the ggml type id."""
+    if name not in KV_TYPE_BYTES:
+        raise ValueError(f"Unsupported KV cache type '{name}', expected one of {list(KV_TYPE_BYTES)}")
+    return getattr(llama_cpp, f"GGML_TYPE_{name.upper()}")
+
+
+def estimate_kv_cache_bytes(metadata: Dict[str, str], n_ctx: int, type_k: str, type_v: str) -> int:
+    """Estimate KV cache size of a context from GGUF metadata.
+
+    Works from metadata alone (e.g. of the vocab-only tokenizer), so it is
+    available before the model is loaded.
+    """
+    arch = metadata.get("general.architecture", "llama")
+    n_layer = int(metadata.get(f"{arch}.block_count", 0))
+    n_embd = int(metadata.get(f"{arch}.embedding_length", 0))
+    n_head = int(metadata.get(f"{arch}.attention.head_count", 1))
+    n_head_kv = int(metadata.get(f"{arch}.attention.head_count_kv", n_head))
+    head_dim = n_embd // n_head if n_head else 0
+    key_length = int(metadata.get(f"{arch}.attention.key_length", head_dim))
+    value_length = int(metadata.get(f"{arch}.attention.value_length", head_dim))
+
+    per_token = n_layer * n_head_kv * (
+        key_length * KV_TYPE_BYTES[type_k] + value_length * KV_TYPE_BYTES[type_v]
+    )
+    return int(per_token * n_ctx)
+
+
+@dataclass
+class Slot:
+    """A single llama.cpp context with its own KV cache."""
+
+    index: int
+    pool: str
+    context_size: int
+    type_k: str
+    type_v: str
+    kv_cache_bytes: int
+    # None until the context is created (long slots are created lazily)
+    model: Optional[Llama] = None
+    busy: bool = False
+
+    @property
+    def allocated(self) -> bool:
+        """Whether the context (and its KV cache) exists."""
+        return self.model is not None
+
+
+@dataclass
+class SlotPool:
+    """Slots of one model, grouped into small- and long-context pools."""
+
+    slots: List[Slot] = field(default_factory=list)
+    # Let requests use a free larger slot when their own pool is full
+    fallback: bool = True
+    _available: Optional[asyncio.Condition] = None
+
+    @property
+    def max_context_size(self) -> int:
+        """Largest context any slot can hold."""
+        return max(slot.context_size for slot in self.slots)
+
+    @property
+    def kv_cache_bytes(self) -> int:
+        """KV cache memory of the allocated slots."""
+        return sum(slot.kv_cache_bytes for slot in self.slots if slot.allocated)
+
+    def _condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    def _pick(self, n_tokens: int) -> Optional[Slot]:
+        """Smallest free slot whose context fits ``n_tokens``.
+
+        Slots of the smallest fitting pool come first so long slots stay free
+        for long prompts; with ``fallback`` a free larger slot is used rather
+        than waiting, preferring slots whose context already exists.
+        """
+        fitting = sorted(
+            (s for s in self.slots if s.context_size >= n_tokens),
+            key=lambda s: s.context_size,
+        )
+        if not fitting:
+            raise ValueError(
+                f"Request needs {n_tokens} tokens, exceeding the maximum context "
+                f"of {self.max_context_size} tokens"
+            )
+        pool = fitting[0].pool
+        for slot in fitting:
+            if slot.pool == pool and not slot.busy:
+                return slot
+        if not self.fallback:
+            return None
+        larger = [s for s in fitting if s.pool != pool and not s.busy]
+        larger.sort(key=lambda s: (not s.allocated, s.context_size))
+        return larger[0] if larger else None
+
+    async def acquire(self, n_tokens: int) -> Slot:
+        """Wait for a free slot that fits ``n_tokens`` and mark it busy."""
+        condition = self._condition()
+        async with condition:
+            slot = self._pick(n_tokens)
+            while slot is None:
+                await condition.wait()
+                slot = self._pick(n_tokens)
+            slot.busy = True
+            return slot
+
+    async def try_acquire(self, context_size: int) -> Optional[Slot]:
+        """Mark a free slot of exactly ``context_size`` busy, without waiting."""
+        condition = self._condition()
+        async with condition:
+            for slot in self.slots:
+                if not slot.busy and slot.context_size == context_size:
+                    slot.busy = True
+                    return slot
+            return None
+
+    async def release(self, slot: Slot):
+        """Return a slot to the pool."""
+        condition = self._condition()
+        async with condition:
+            slot.busy = False
+            condition.notify_all()
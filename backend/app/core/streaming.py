@@ -0,0 +1,181 @@
+"""Low-overhead token streaming from decode threads to the event loop."""
+import asyncio
+import codecs
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class StreamChunk:
+    """Coalesced text of one candidate; its last chunk carries the finish reason."""
+
+    text: str
+    finish_reason: Optional[str] = None
+    index: int = 0
+
+
+class Utf8Detokenizer:
+    """Turns token ids into text without splitting multi-byte characters.
+
+    A Cyrillic letter is two bytes and byte-fallback tokens can end in the
+    middle of one, so bytes are fed through an incremental UTF-8 decoder that
+    holds incomplete sequences until the next token completes them.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, token: int) -> str:
+        """Decode one token, returning only complete characters."""
+        return self._decoder.decode(self.model.detokenize([token]))
+
+    def flush(self) -> str:
+        """Return whatever is left at the end of generation."""
+        return self._decoder.decode(b"", final=True)
+
+
+class StopMatcher:
+    """Detects stop sequences in streamed text.
+
+    Text that could be the beginning of a stop sequence is held back until it
+    is either completed (generation stops) or ruled out (text is released).
+    """
+
+    def __init__(self, stop: Optional[List[str]]):
+        self.stop = [s for s in (stop or []) if s]
+        self._pending = ""
+
+    def feed(self, text: str) -> Tuple[str, bool]:
+        """Add text; return (text safe to emit, whether a stop sequence matched)."""
+        if not self.stop:
+            return text, False
+
+        self._pending += text
+        for s in self.stop:
+            pos = self._pending.find(s)
+            if pos != -1:
+                emit = self._pending[:pos]
+                self._pending = ""
+                return emit, True
+
+        hold = 0
+        for s in self.stop:
+            for n in range(min(len(s) - 1, len(self._pending)), hold, -1):
+                if self._pending.endswith(s[:n]):
+                    hold = n
+                    break
+        emit = self._pending[: len(self._pending) - hold]
+        self._pending = self._pending[len(self._pending) - hold:]
+        return emit, False
+
+    def flush(self) -> str:
+        """Release held-back text when generation ends without a stop."""
+        text, self._pending = self._pending, ""
+        return text
+
+
+class TokenChannel:
+    """Hands decoded text from decode threads to an async consumer.
+
+    Producers append to a deque (atomic in CPython, no locks) and wake the
+    event loop only once per flush: after ``flush_tokens`` pieces or
+    ``flush_interval`` seconds since the last flush, whichever comes first.
+    The consumer receives the pending pieces joined into one chunk per
+    candidate, interleaved by candidate index.
+
+    Producers only check the interval when a piece arrives, so after every
+    flush the consumer arms a ``flush_interval`` timer on the loop: pieces
+    left behind by a stalled producer go out once the interval is up rather
+    than with the next token.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, flush_tokens: int = 1, flush_interval: float = 0.0):
+        self._loop = loop
+        self._buffer: Deque[Tuple[int, str, Optional[str]]] = deque()
+        self._event = asyncio.Event()
+        self._wake_scheduled = False
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self.flush_tokens = max(1, flush_tokens)
+        self.flush_interval = flush_interval
+
+    def _wake(self, force: bool = False):
+        if force or not self._wake_scheduled:
+            self._wake_scheduled = True
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def put(self, text: str, index: int = 0):
+        """Queue text of candidate ``index`` from a producer thread."""
+        if not text:
+            return
+        self._buffer.append((index, text, None))
+        self._pending += 1
+        now = time.monotonic()
+        if self._pending >= self.flush_tokens or now - self._last_flush >= self.flush_interval:
+            self._pending = 0
+            self._last_flush = now
+            self._wake()
+
+    def finish(self, index: int, finish_reason: str):
+        """Mark candidate ``index`` as finished."""
+        self._buffer.append((index, "", finish_reason))
+        self._wake(force=True)
+
+    def close(self, error: Optional[BaseException] = None):
+        """Finish the stream from the producer side."""
+        self._error = error
+        self._closed = True
+        self._wake(force=True)
+
+    def _drain(self) -> List[StreamChunk]:
+        texts: Dict[int, List[str]] = {}
+        reasons: Dict[int, str] = {}
+        while self._buffer:
+            index, text, finish_reason = self._buffer.popleft()
+            texts.setdefault(index, []).append(text)
+            if finish_reason is not None:
+                reasons[index] = finish_reason
+        return [
+            StreamChunk("".join(texts[index]), reasons.get(index), index)
+            for index in sorted(texts)
+        ]
+
+    async def __aiter__(self) -> AsyncIterator[StreamChunk]:
+        timer: Optional[asyncio.TimerHandle] = None
+        flushed = True  # the channel counts as flushed when created
+        try:
+            while True:
+                if flushed and self.flush_interval > 0:
+                    # A piece put within flush_interval of the last flush does
+                    # not wake the loop itself; once the interval is up any new
+                    # piece does, so an idle channel needs no timer
+                    delay = self._last_flush + self.flush_interval - time.monotonic()
+                    timer = self._loop.call_later(max(0.0, delay), self._event.set)
+                await self._event.wait()
+                self._event.clear()
+                self._wake_scheduled = False
+                if timer is not None:
+                    timer.cancel()
+                    timer = None
+
+                closed = self._closed
+                chunks = self._drain()
+                flushed = bool(chunks)
+                if chunks:
+                    self._pending = 0
+                    self._last_flush = time.monotonic()
+                for chunk in chunks:
+                    yield chunk
+
+                if closed:
+                    if self._error is not None:
+                        raise self._error
+                    return
+        finally:
+            if timer is not None:
+                timer.cancel()
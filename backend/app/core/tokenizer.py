@@ -0,0 +1,102 @@
+"""Tokenization helpers shared by prompt budgeting and inference."""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class TokenCache:
+    """Thread-safe LRU cache of token arrays for prompt segments.
+
+    Bounded by the total number of cached tokens rather than entries, so a
+    few long documents cannot pin more memory than many short turns.
+    """
+
+    def __init__(self, max_tokens: int = 1_000_000):
+        self.max_tokens = max_tokens
+        self._entries: "OrderedDict[Hashable, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_tokens = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_tokenize(self, key: Hashable, tokenize: Callable[[], List[int]]) -> List[int]:
+        """Return cached tokens for ``key`` or tokenize and cache them.
+
+        Segments longer than the whole cache are returned without caching.
+        """
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return tokens
+
+        tokens = tokenize()
+
+        with self._lock:
+            self.misses += 1
+            if len(tokens) > self.max_tokens:
+                return tokens
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_tokens -= len(previous)
+            self._entries[key] = tokens
+            self.total_tokens += len(tokens)
+            while self.total_tokens > self.max_tokens:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_tokens -= len(evicted)
+        return tokens
+
+    def clear(self):
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+            self.total_tokens = 0
+
+
+class Tokenizer:
+    """Vocab-only tokenizer loaded from a GGUF file.
+
+    Loads only the vocabulary (no weights, no context), so it is ready in
+    milliseconds, stays usable while the model itself is unloaded and never
+    competes with inference slots.
+    """
+
+    def __init__(self, model_path: str, cache_max_tokens: int = 1_000_000):
+        self.model_path = model_path
+        self.cache = TokenCache(cache_max_tokens)
+        self._vocab = None
+        self._load_lock = threading.Lock()
+
+    def is_loaded(self) -> bool:
+        """Check if the vocabulary is loaded."""
+        return self._vocab is not None
+
+    def load(self):
+        """Load the vocabulary from the GGUF file."""
+        with self._load_lock:
+            if self._vocab is None:
+                from llama_cpp import Llama
+
+                self._vocab = Llama(model_path=self.model_path, vocab_only=True, verbose=False)
+
+    def metadata(self) -> Dict[str, str]:
+        """GGUF metadata of the model (loads the vocabulary if needed)."""
+        self.load()
+        return self._vocab.metadata
+
+    def token_bos(self) -> int:
+        """Beginning-of-sequence token id."""
+        return self._vocab.token_bos()
+
+    def tokenize_segment(self, segment: str, key: Optional[Hashable] = None) -> List[int]:
+        """Tokenize a prompt segment (no BOS, special tokens parsed), cached.
+
+        Args:
+            segment: Text to tokenize
+            key: Cache key; defaults to the segment itself
+        """
+        return self.cache.get_or_tokenize(
+            segment if key is None else key,
+            lambda: self._vocab.tokenize(segment.encode("utf-8"), add_bos=False, special=True),
+        )
@@ -1,13 +1,18 @@
 """Main FastAPI application."""
+import asyncio
 import logging
+import signal
 import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.core.config import settings
-from app.core.inference import inference_engine
-from app.api.routes import generation, models, embeddings
+from app.core.registry import model_registry
+from app.core.embeddings import embeddings_backend
+from app.api.routes import generation, models, embeddings, admin
+from app.api.body import add_body_schemas
 from app.api.middleware.metrics import MetricsMiddleware, get_metrics
 
 # Configure logging
@@ -20,27 +25,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def install_drain_on_sigterm():
+    """Start draining on SIGTERM, before uvicorn waits for open connections.
+
+    Uvicorn stops accepting connections on SIGTERM and waits for in-flight
+    ones (including long streams) before running lifespan shutdown, so the
+    drain deadline has to start from the signal itself.
+    """
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        loop.call_soon_threadsafe(model_registry.start_drain, settings.drain_timeout)
+        if callable(previous):
+            previous(signum, frame)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        # Only the main thread may install handlers (e.g. not under TestClient)
+        logger.warning("Not in the main thread, SIGTERM will not start a drain")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan - load model on startup, cleanup on shutdown."""
     # Startup
     logger.info("Starting AI UA API server")
-    logger.info(f"Model: {settings.model_name}")
+    logger.info(f"Models: {', '.join(model_registry.names())}")
     logger.info(f"Context size: {settings.model_context_size}")
     logger.info(f"Max concurrent requests: {settings.max_concurrent_requests}")
 
     try:
-        inference_engine.load_model()
+        model_registry.load_preloaded()
         logger.info("Model loaded successfully - server ready")
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
         logger.error("Server starting without model - health check will fail")
 
+    await embeddings_backend.start()
+    install_drain_on_sigterm()
+
     yield
 
     # Shutdown
     logger.info("Shutting down server")
-    inference_engine.shutdown()
+    await model_registry.drain(settings.drain_timeout)
+    model_registry.shutdown()
+    await embeddings_backend.shutdown()
 
 
 # Create FastAPI app
@@ -49,6 +81,7 @@ app = FastAPI(
     description="Ukrainian AI model with Gemini-compatible API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -68,11 +101,24 @@ if settings.enable_metrics:
 app.include_router(generation.router, prefix="/v1", tags=["generation"])
 app.include_router(models.router, prefix="/v1", tags=["models"])
 app.include_router(embeddings.router, prefix="/v1", tags=["embeddings"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 # Metrics endpoint
 if settings.enable_metrics:
     app.get("/metrics", tags=["monitoring"])(get_metrics)
 
+_openapi = app.openapi
+
+
+def openapi():
+    """OpenAPI schema including request bodies parsed by ``json_body``."""
+    if app.openapi_schema is None:
+        add_body_schemas(_openapi())
+    return app.openapi_schema
+
+
+app.openapi = openapi
+
 
 @app.get("/", tags=["root"])
 async def root():
@@ -82,12 +128,19 @@ async def root():
         "version": "1.0.0",
         "description": "Local Gemini-compatible API with Ukrainian MamayLM model",
         "model": settings.model_name,
-        "status": "ready" if inference_engine.is_loaded() else "loading",
+        "models": model_registry.names(),
+        "status": (
+            "draining" if model_registry.draining
+            else "model_not_loaded" if model_registry.load_error(model_registry.default_model)
+            else "ready"
+        ),
         "endpoints": {
             "health": "/v1/health",
+            "ready": "/v1/ready",
             "models": "/v1/models",
             "generate": "/v1/models/{model}/generateContent",
             "stream": "/v1/models/{model}/generateContentStream",
+            "count_tokens": "/v1/models/{model}/countTokens",
             "embed": "/v1/models/{model}/embedContent",
             "metrics": "/metrics",
         },
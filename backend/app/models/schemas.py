@@ -1,6 +1,6 @@
 """Pydantic models for Gemini-compatible API."""
 from typing import List, Optional, Dict, Any, Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 # ==================== Request Models ====================
@@ -23,10 +23,21 @@ class GenerationConfig(BaseModel):
     topK: Optional[int] = Field(None, alias="top_k", ge=1)
     topP: Optional[float] = Field(None, alias="top_p", ge=0.0, le=1.0)
     stopSequences: Optional[List[str]] = Field(None, alias="stop_sequences")
+    candidateCount: Optional[int] = Field(None, alias="candidate_count", ge=1, le=8)
+    responseMimeType: Optional[Literal["text/plain", "application/json"]] = Field(
+        None, alias="response_mime_type"
+    )
+    responseSchema: Optional[Dict[str, Any]] = Field(None, alias="response_schema")
 
     class Config:
         populate_by_name = True
 
+    @model_validator(mode="after")
+    def _schema_requires_json(self):
+        if self.responseSchema is not None and self.responseMimeType != "application/json":
+            raise ValueError("responseSchema requires responseMimeType 'application/json'")
+        return self
+
 
 class GenerateContentRequest(BaseModel):
     """Request for generateContent endpoint."""
@@ -37,6 +48,16 @@ class GenerateContentRequest(BaseModel):
         populate_by_name = True
 
 
+class CountTokensRequest(BaseModel):
+    """Request for countTokens endpoint."""
+    contents: List[Content]
+
+
+class BatchCountTokensRequest(BaseModel):
+    """Request for batchCountTokens endpoint."""
+    requests: List[CountTokensRequest]
+
+
 class EmbedContentRequest(BaseModel):
     """Request for embedContent endpoint."""
     content: str
@@ -88,6 +109,19 @@ class GenerateContentResponse(BaseModel):
         populate_by_name = True
 
 
+class CountTokensResponse(BaseModel):
+    """Response for countTokens endpoint."""
+    totalTokens: int = Field(..., alias="total_tokens")
+
+    class Config:
+        populate_by_name = True
+
+
+class BatchCountTokensResponse(BaseModel):
+    """Response for batchCountTokens endpoint."""
+    results: List[CountTokensResponse]
+
+
 class ContentEmbedding(BaseModel):
     """Embedding vector."""
     values: List[float]
@@ -117,10 +151,29 @@ class ListModelsResponse(BaseModel):
     models: List[ModelInfo]
 
 
+class SlotInfo(BaseModel):
+    """Context slot with its KV cache memory."""
+    index: int
+    pool: str
+    contextSize: int
+    kvCacheBytes: int
+    allocated: bool
+    busy: bool
+
+
+class ListSlotsResponse(BaseModel):
+    """Response for model slots endpoint."""
+    model: str
+    loaded: bool
+    slots: List[SlotInfo]
+    totalKvCacheBytes: int
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
     model_loaded: bool
+    loaded_models: List[str] = []
     gpu: bool
     version: str = "1.0.0"
 
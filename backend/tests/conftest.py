@@ -0,0 +1,100 @@
+"""Test setup: makes ``app`` importable and replaces llama_cpp with a stub.
+
+The stub ``Llama`` tokenizes one token per byte and always answers with
+``REPLY`` followed by ``<end_of_turn>``, which is enough to drive the engine
+through slot placement, prefill, forking and decoding without model weights.
+"""
+import os
+import sys
+import types
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+BOS, EOS, END_OF_TURN = 0, 1, 2
+BYTE_OFFSET = 3
+REPLY = "Привіт"
+
+METADATA: Dict[str, str] = {
+    "general.architecture": "gemma3",
+    "gemma3.block_count": "2",
+    "gemma3.embedding_length": "64",
+    "gemma3.attention.head_count": "4",
+    "gemma3.attention.head_count_kv": "2",
+}
+
+
+class StubLlama:
+    """Minimal stand-in for ``llama_cpp.Llama``."""
+
+    instances: List["StubLlama"] = []
+
+    def __init__(self, model_path: str, n_ctx: int = 512, vocab_only: bool = False, **kwargs):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.vocab_only = vocab_only
+        self.kwargs = kwargs
+        self.metadata = dict(METADATA)
+        self.ctx = object()
+        self._input_ids: List[int] = []
+        self.n_tokens = 0
+        self.evaluated: List[int] = []
+        StubLlama.instances.append(self)
+
+    def token_bos(self) -> int:
+        return BOS
+
+    def token_eos(self) -> int:
+        return EOS
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        if special and text == b"<end_of_turn>":
+            return [END_OF_TURN]
+        return ([BOS] if add_bos else []) + [b + BYTE_OFFSET for b in text]
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return bytes(t - BYTE_OFFSET for t in tokens if t >= BYTE_OFFSET)
+
+    def eval(self, tokens: List[int]):
+        self._input_ids = self._input_ids[:self.n_tokens] + list(tokens)
+        self.n_tokens = len(self._input_ids)
+        self.evaluated.extend(tokens)
+
+    def generate(self, tokens: List[int], **kwargs):
+        # Like Llama.generate: only evaluate what is not in the KV cache yet
+        prefix = 0
+        for cached, token in zip(self._input_ids[:self.n_tokens], tokens[:-1]):
+            if cached != token:
+                break
+            prefix += 1
+        self.n_tokens = prefix
+        self.eval(tokens[prefix:])
+        for token in self.tokenize(REPLY.encode("utf-8"), add_bos=False) + [END_OF_TURN]:
+            yield token
+
+    def save_state(self) -> List[int]:
+        return list(self._input_ids)
+
+    def load_state(self, state: List[int]):
+        self._input_ids = list(state)
+        self.n_tokens = len(state)
+
+
+class StubLlamaGrammar:
+    def __init__(self, text: str, root: str = "root"):
+        self.text = text
+        self.root = root
+
+
+def _install_stub():
+    module = types.ModuleType("llama_cpp")
+    module.Llama = StubLlama
+    module.LlamaGrammar = StubLlamaGrammar
+    module.thread_counts = []
+    module.llama_set_n_threads = lambda ctx, decode, prefill: module.thread_counts.append((decode, prefill))
+    for index, name in enumerate(("F32", "F16", "Q4_0", "Q4_1", "Q5_0", "Q5_1", "Q8_0")):
+        setattr(module, f"GGML_TYPE_{name}", index)
+    sys.modules["llama_cpp"] = module
+
+
+_install_stub()
@@ -0,0 +1,50 @@
+"""Tests of JSON body parsing and its OpenAPI documentation."""
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_validation_error_loc_starts_with_body():
+    client = TestClient(app)
+
+    response = client.post("/v1/models/unknown/countTokens", json={"contents": "not a list"})
+
+    assert response.status_code == 422
+    assert all(error["loc"][0] == "body" for error in response.json()["detail"])
+    assert response.json()["detail"][0]["loc"][:2] == ["body", "contents"]
+
+
+def test_invalid_json_error_loc():
+    client = TestClient(app)
+
+    response = client.post(
+        "/v1/models/unknown/countTokens", content=b"{", headers={"content-type": "application/json"}
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+
+
+def test_request_bodies_documented():
+    schema = TestClient(app).get("/openapi.json").json()
+
+    operation = schema["paths"]["/v1/models/{model_name}/generateContent"]["post"]
+    ref = operation["requestBody"]["content"]["application/json"]["schema"]["$ref"]
+    assert ref == "#/components/schemas/GenerateContentRequest"
+    components = schema["components"]["schemas"]
+    assert "GenerateContentRequest" in components
+    # Every reference resolves
+    refs = set()
+
+    def collect(node):
+        if isinstance(node, dict):
+            if isinstance(node.get("$ref"), str):
+                refs.add(node["$ref"].rsplit("/", 1)[-1])
+            for value in node.values():
+                collect(value)
+        elif isinstance(node, list):
+            for value in node:
+                collect(value)
+
+    collect(schema)
+    assert refs <= set(components)
@@ -0,0 +1,25 @@
+"""Tests of the CPU budget split."""
+from app.core.cpu import CpuBudget
+
+
+def test_share_split_between_sequences():
+    budget = CpuBudget(cores=17, reserved_cores=1, decode_max_threads=8)
+    with budget.sequence():
+        assert budget.threads() == {"prefill": 16, "decode": 8}
+        with budget.sequence():
+            assert budget.threads() == {"prefill": 8, "decode": 8}
+
+
+def test_share_capped_by_model_threads():
+    budget = CpuBudget(cores=16, decode_max_threads=8)
+    with budget.sequence(max_threads=4) as lease:
+        assert budget.threads(lease.max_threads) == {"prefill": 4, "decode": 4}
+        # The cap only lowers the share
+        assert budget.threads(32) == {"prefill": 16, "decode": 8}
+
+
+def test_reserved_cores_follow_embeddings_threads():
+    from app.core.config import Settings
+
+    assert Settings(_env_file=None, embeddings_threads=4).reserved_cores() == 5
+    assert Settings(_env_file=None, embeddings_threads=4, cpu_reserved_cores=1).reserved_cores() == 1
@@ -0,0 +1,105 @@
+"""Smoke tests of InferenceEngine against the stub Llama from conftest."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from conftest import END_OF_TURN, EOS, REPLY, StubLlama
+
+from app.core.config import ModelConfig
+from app.core.inference import InferenceEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "model.gguf"
+    path.write_bytes(b"GGUF")
+    config = ModelConfig(
+        name="test",
+        path=str(path),
+        context_size=256,
+        small_context_size=128,
+        small_slots=2,
+        long_slots=1,
+        output_reserve_tokens=16,
+    )
+    executor = ThreadPoolExecutor(max_workers=4)
+    engine = InferenceEngine(config, executor)
+    StubLlama.instances.clear()
+    yield engine
+    engine.shutdown()
+    executor.shutdown(wait=True)
+
+
+def test_load_model(engine):
+    engine.load_model()
+
+    assert engine.is_loaded()
+    assert engine._eog_tokens == {EOS, END_OF_TURN}
+    slots = engine.slot_info()
+    assert [s["pool"] for s in slots] == ["small", "small", "long"]
+    # The long slot is created on first use
+    assert [s["allocated"] for s in slots] == [True, True, False]
+
+
+def test_generate_candidates(engine):
+    engine.load_model()
+
+    result = asyncio.run(engine.generate("Hi", max_tokens=32, candidate_count=2))
+
+    assert [c["text"] for c in result["candidates"]] == [REPLY, REPLY]
+    assert [c["finish_reason"] for c in result["candidates"]] == ["STOP", "STOP"]
+    reply_tokens = len(REPLY.encode("utf-8"))
+    assert result["prompt_tokens"] == 3
+    assert result["completion_tokens"] == 2 * reply_tokens
+    # Both candidates ran in their own small slot, released afterwards
+    assert not any(s["busy"] for s in engine.slot_info())
+
+
+def test_generate_max_tokens(engine):
+    engine.load_model()
+
+    result = asyncio.run(engine.generate("Hi", max_tokens=4))
+
+    candidate = result["candidates"][0]
+    assert candidate["finish_reason"] == "MAX_TOKENS"
+    assert candidate["completion_tokens"] == 4
+    assert candidate["text"] == REPLY[:2]
+
+
+def test_generate_stream_candidates(engine):
+    engine.load_model()
+
+    async def collect():
+        return [chunk async for chunk in engine.generate_stream("Hi", max_tokens=32, candidate_count=2)]
+
+    chunks = asyncio.run(collect())
+
+    texts = {0: "", 1: ""}
+    finish = {}
+    for chunk in chunks:
+        texts[chunk.index] += chunk.text
+        if chunk.finish_reason is not None:
+            finish[chunk.index] = chunk.finish_reason
+    assert texts == {0: REPLY, 1: REPLY}
+    assert finish == {0: "STOP", 1: "STOP"}
+    assert not any(s["busy"] for s in engine.slot_info())
+
+
+def test_long_prompt_allocates_long_slot(engine):
+    engine.load_model()
+
+    result = asyncio.run(engine.generate("x" * 150, max_tokens=8))
+
+    assert result["candidates"][0]["completion_tokens"] == 8
+    assert engine.slot_info()[2]["allocated"]
+
+
+def test_explicit_max_tokens_is_reserved(engine):
+    engine.load_model()
+
+    # The default reserve fits the small slot, an explicit 200 only the long one
+    asyncio.run(engine.generate("Hi", max_tokens=200))
+    assert not engine.slot_info()[2]["allocated"]
+
+    asyncio.run(engine.generate("Hi", max_tokens=200, reserve_tokens=200))
+    assert engine.slot_info()[2]["allocated"]
@@ -0,0 +1,23 @@
+"""Tests of application startup helpers."""
+import asyncio
+import threading
+
+from app.main import install_drain_on_sigterm
+
+
+def test_drain_on_sigterm_outside_main_thread():
+    errors = []
+
+    def run():
+        async def install():
+            install_drain_on_sigterm()
+
+        try:
+            asyncio.run(install())
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert errors == []
@@ -0,0 +1,21 @@
+"""Tests of the on-demand profiler helpers."""
+import asyncio
+
+import pytest
+
+from app.core import profiling
+
+
+def test_run_in_thread_result():
+    assert asyncio.run(profiling.run_in_thread(sum, [1, 2, 3])) == 6
+
+
+def test_run_in_thread_busy():
+    async def run():
+        first = asyncio.ensure_future(profiling.run_in_thread(profiling.sample_stacks, 0.3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(profiling.ProfilerBusyError):
+            await asyncio.wait_for(profiling.run_in_thread(profiling.sample_stacks, 0.3), timeout=5)
+        return await first
+
+    assert isinstance(asyncio.run(run()), str)
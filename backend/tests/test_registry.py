@@ -0,0 +1,65 @@
+"""Tests of model loading in the registry."""
+import asyncio
+
+import pytest
+
+from app.core.config import ModelConfig, settings
+from app.core.registry import ModelLoadError, ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "model.gguf"
+    path.write_bytes(b"GGUF")
+    registry = ModelRegistry([ModelConfig(name="test", path=str(path))])
+    yield registry
+    registry.shutdown()
+
+
+def _fail_next_loads(registry, monkeypatch, count: int):
+    engine = registry.get("test")
+    load_model = engine.load_model
+    attempts = []
+
+    def flaky_load():
+        attempts.append(1)
+        if len(attempts) <= count:
+            raise OSError("model file not found")
+        load_model()
+
+    monkeypatch.setattr(engine, "load_model", flaky_load)
+    return attempts
+
+
+def test_failed_load_backs_off(registry, monkeypatch):
+    monkeypatch.setattr(settings, "model_load_retry_seconds", 60.0)
+    attempts = _fail_next_loads(registry, monkeypatch, 1)
+
+    async def run():
+        with pytest.raises(ModelLoadError):
+            await registry.acquire("test")
+        # Within the backoff the load is not attempted again
+        with pytest.raises(ModelLoadError, match="retrying in"):
+            await registry.acquire("test")
+
+    asyncio.run(run())
+    assert len(attempts) == 1
+    assert registry.load_error("test") == "model file not found"
+    assert 0 < registry.load_retry_in("test") <= 60
+
+
+def test_failed_load_is_retried(registry, monkeypatch):
+    monkeypatch.setattr(settings, "model_load_retry_seconds", 0.0)
+    attempts = _fail_next_loads(registry, monkeypatch, 2)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ModelLoadError):
+                await registry.acquire("test")
+        return await registry.acquire("test")
+
+    engine = asyncio.run(run())
+    assert engine.is_loaded()
+    assert len(attempts) == 3
+    assert registry.load_error("test") is None
+    assert registry.load_retry_in("test") == 0
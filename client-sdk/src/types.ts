@@ -17,6 +17,9 @@ export interface GenerationConfig {
   topK?: number;
   topP?: number;
   stopSequences?: string[];
+  candidateCount?: number;
+  responseMimeType?: 'text/plain' | 'application/json';
+  responseSchema?: Record<string, unknown>;
 }
 
 export interface GenerateContentRequest {
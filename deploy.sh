@@ -70,10 +70,8 @@ else
     print_success "Python3 already installed"
 fi
 
-# Step 2: Install huggingface_hub for model download
-print_info "Installing huggingface_hub..."
-pip3 install -q huggingface_hub
-print_success "huggingface_hub installed"
+# Step 2: Model downloader (scripts/downloader.py) needs only the Python standard library
+print_success "Model downloader ready"
 
 # Step 3: Create .env file
 if [ ! -f .env ]; then
@@ -86,7 +84,7 @@ fi
 
 # Step 4: Download model
 print_info "Checking model file..."
-if [ ! -f "backend/models/mamay-gemma-3-12b-q5_k_s.gguf" ]; then
+if [ ! -f "backend/models/mamay-gemma-3-12b-q5_k_m.gguf" ]; then
     print_info "Downloading MamayLM model (8.23GB)..."
     print_info "This may take 10-30 minutes depending on your connection"
     python3 scripts/download_with_python.py
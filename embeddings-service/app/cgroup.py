@@ -0,0 +1 @@
+../../backend/app/core/cgroup.py
\ No newline at end of file
@@ -1,12 +1,19 @@
 """Embeddings service using sentence-transformers."""
+import asyncio
 import logging
+import os
 import sys
+import time
 from contextlib import asynccontextmanager
-from typing import Optional
-from fastapi import FastAPI, HTTPException
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from pydantic import BaseModel
+import torch
 from sentence_transformers import SentenceTransformer
 
+from app.cgroup import available_cores
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,23 +27,210 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
 model: Optional[SentenceTransformer] = None
 
+# Torch threads (0 = cores from cgroup quota and affinity). Torch defaults to
+# the host core count, which oversubscribes a CPU-limited container and
+# competes with llama.cpp threads on shared hosts.
+EMBEDDINGS_THREADS = int(os.getenv("EMBEDDINGS_THREADS", "0"))
+
+# Requests waiting together are encoded in one forward pass (up to this many)
+EMBEDDINGS_MAX_BATCH = int(os.getenv("EMBEDDINGS_MAX_BATCH", "32"))
+
+# Metrics carry an embeddings_ prefix so they never collide with the
+# backend's series (api_requests_total, inference_latency_seconds, ...)
+# when both are scraped into one Prometheus
+REQUEST_COUNT = Counter(
+    "embeddings_api_requests_total",
+    "Total API requests",
+    ["method", "endpoint", "status"],
+)
+
+REQUEST_LATENCY = Histogram(
+    "embeddings_api_request_latency_seconds",
+    "API request latency",
+    ["method", "endpoint"],
+)
+
+ACTIVE_REQUESTS = Gauge(
+    "embeddings_active_requests",
+    "Number of active requests",
+)
+
+INFERENCE_LATENCY = Histogram(
+    "embeddings_inference_latency_seconds",
+    "Model inference latency",
+    ["model", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+MODEL_MEMORY_BYTES = Gauge(
+    "embeddings_model_memory_bytes",
+    "Estimated model memory usage",
+    ["model"],
+)
+
+INPUT_TOKENS = Histogram(
+    "embeddings_input_tokens",
+    "Input length in tokens, before truncation to the model's max sequence length",
+    ["model"],
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+
+TRUNCATED_INPUTS = Counter(
+    "embeddings_truncated_inputs_total",
+    "Inputs longer than the model's max sequence length",
+    ["model"],
+)
+
+QUEUE_TIME = Histogram(
+    "embeddings_queue_seconds",
+    "Time a text waited before its batch started encoding",
+    ["model"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+QUEUE_DEPTH = Gauge(
+    "embeddings_queue_depth",
+    "Texts waiting to be encoded",
+    ["model"],
+)
+
+BATCH_SIZE = Histogram(
+    "embeddings_batch_size",
+    "Texts encoded per forward pass",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+
+def _input_lengths(texts: List[str], features: Dict[str, Any]) -> List[int]:
+    """Token counts of texts before truncation to max_seq_length.
+
+    Only texts that filled max_seq_length can have been truncated; just those
+    are tokenized again, untruncated, with the preprocessing of
+    ``model.tokenize`` (stripped, lowercased if the model does so).
+    """
+    lengths = features["attention_mask"].sum(dim=1).tolist()
+    clipped = [i for i, length in enumerate(lengths) if length >= model.max_seq_length]
+    if clipped:
+        lowercase = getattr(model[0], "do_lower_case", False)
+        full = model.tokenizer(
+            [texts[i].strip().lower() if lowercase else texts[i].strip() for i in clipped],
+            truncation=False,
+            verbose=False,
+        )["input_ids"]
+        for i, ids in zip(clipped, full):
+            lengths[i] = len(ids)
+    return lengths
+
+
+def _encode(texts: List[str]) -> List[List[float]]:
+    """Embed texts, recording their length before truncation.
+
+    Texts are tokenized with ``model.tokenize``, exactly as ``model.encode``
+    does, and the features are passed to the model directly, so the
+    tokenization is also available for the length metrics.
+    """
+    features = model.tokenize(texts)
+    for length in _input_lengths(texts, features):
+        INPUT_TOKENS.labels(model=MODEL_NAME).observe(length)
+        if length > model.max_seq_length:
+            TRUNCATED_INPUTS.labels(model=MODEL_NAME).inc()
+
+    features = {name: tensor.to(model.device) for name, tensor in features.items()}
+    with torch.inference_mode():
+        embeddings = model(features)["sentence_embedding"]
+    return embeddings.cpu().tolist()
+
+
+class EmbeddingBatcher:
+    """Encodes queued texts in batches, off the event loop.
+
+    Encoding inline in the handler blocked the event loop (and /health) and
+    serialized requests. Now whatever has queued up while the previous
+    batch ran is encoded together in a worker thread.
+    """
+
+    def __init__(self, max_batch: int):
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Tuple[str, float, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def encode(self, text: str) -> List[float]:
+        """Queue one text and wait for its embedding."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, time.perf_counter(), future))
+        QUEUE_DEPTH.labels(model=MODEL_NAME).set(self._queue.qsize())
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            QUEUE_DEPTH.labels(model=MODEL_NAME).set(self._queue.qsize())
+            batch = [item for item in batch if not item[2].cancelled()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for _, queued_at, _ in batch:
+                QUEUE_TIME.labels(model=MODEL_NAME).observe(start - queued_at)
+            BATCH_SIZE.labels(model=MODEL_NAME).observe(len(batch))
+
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = await asyncio.to_thread(_encode, texts)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            INFERENCE_LATENCY.labels(model=MODEL_NAME, method="encode").observe(time.perf_counter() - start)
+            for (_, _, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+batcher = EmbeddingBatcher(EMBEDDINGS_MAX_BATCH)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load model on startup."""
     global model
 
+    threads = EMBEDDINGS_THREADS or available_cores()
+    torch.set_num_threads(threads)
+    logger.info(f"Torch threads: {threads}")
+
     logger.info(f"Loading embeddings model: {MODEL_NAME}")
     try:
         model = SentenceTransformer(MODEL_NAME)
         logger.info(f"Model loaded successfully - dimensions: {model.get_sentence_embedding_dimension()}")
+        MODEL_MEMORY_BYTES.labels(model=MODEL_NAME).set(
+            sum(p.numel() * p.element_size() for p in model.parameters())
+        )
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
         raise
 
+    batcher.start()
+
     yield
 
     logger.info("Shutting down embeddings service")
+    await batcher.stop()
 
 
 app = FastAPI(
@@ -47,6 +241,25 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Collect request metrics with the backend's label scheme."""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
+    ACTIVE_REQUESTS.inc()
+    start_time = time.time()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        ACTIVE_REQUESTS.dec()
+        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, status=status).inc()
+        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(time.time() - start_time)
+
+
 class EmbedRequest(BaseModel):
     """Embedding request."""
     text: str
@@ -72,9 +285,8 @@ async def create_embedding(request: EmbedRequest):
         raise HTTPException(status_code=503, detail="Model not loaded")
 
     try:
-        # Generate embedding
-        embedding = model.encode(request.text, convert_to_numpy=True)
-        embedding_list = embedding.tolist()
+        # Generate embedding (batched with concurrent requests)
+        embedding_list = await batcher.encode(request.text)
 
         logger.debug(f"Generated embedding for text of length {len(request.text)}")
 
@@ -88,6 +300,12 @@ async def create_embedding(request: EmbedRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -106,6 +324,7 @@ async def root():
         "version": "1.0.0",
         "model": MODEL_NAME,
         "status": "ready" if model is not None else "loading",
+        "metrics": "/metrics",
     }
 
 
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Latency benchmark for the CPU budget under mixed generation/embedding load.
+
+Fires concurrent short generateContent requests, optionally alongside a
+stream of embedContent requests, and reports latency percentiles together
+with the thread counts and CPU throttling exposed on /metrics. Then measures
+aggregate prefill throughput (long prompts, one output token) and decode
+throughput (short prompts, many output tokens) at the same concurrency.
+Run it with CPU_BUDGET_ENABLED=true and false to compare.
+
+Usage:
+    python scripts/bench_cpu_budget.py [--url http://localhost:8000] [--concurrency 4]
+        [--requests 32] [--embeddings 2] [--prefill-repeat 40] [--decode-tokens 128]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PROMPT = "Коротко поясни, що таке фотосинтез."
+TEXT = "Тестовий текст для векторизації. " * 20
+PARAGRAPH = "Фотосинтез — процес утворення органічних речовин з вуглекислого газу і води на світлі. "
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def generation_worker(client, url, model, queue, latencies):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        response = await client.post(
+            f"{url}/v1/models/{model}/generateContent",
+            json={
+                "contents": [{"role": "user", "parts": [{"text": PROMPT}]}],
+                "generationConfig": {"maxOutputTokens": 64, "temperature": 0},
+            },
+        )
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def throughput_worker(client, url, model, queue, totals, prompt, max_tokens):
+    while True:
+        try:
+            i = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        # A distinct first line per request so no slot reuses a cached prefix
+        response = await client.post(
+            f"{url}/v1/models/{model}/generateContent",
+            json={
+                "contents": [{"role": "user", "parts": [{"text": f"Запит {i}.\n{prompt}"}]}],
+                "generationConfig": {"maxOutputTokens": max_tokens, "temperature": 0},
+            },
+        )
+        response.raise_for_status()
+        usage = response.json()["usageMetadata"]
+        totals["prompt"] += usage["promptTokenCount"]
+        totals["output"] += usage["candidatesTokenCount"]
+
+
+async def throughput(client, args, prompt, max_tokens):
+    """Aggregate (prompt tokens/s, output tokens/s) over ``args.requests`` requests."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+    totals = {"prompt": 0, "output": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        throughput_worker(client, args.url, args.model, queue, totals, prompt, max_tokens)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return totals["prompt"] / elapsed, totals["output"] / elapsed
+
+
+async def embedding_worker(client, url, stop):
+    while not stop.is_set():
+        await client.post(
+            f"{url}/v1/models/text-embedding-multilingual/embedContent",
+            json={"content": TEXT},
+        )
+
+
+async def scrape(client, url):
+    text = (await client.get(f"{url}/metrics")).text
+    wanted = ("llama_threads", "cpu_available_cores", "cpu_throttled_seconds_total", "cpu_budget_sequences")
+    return [line for line in text.splitlines() if line.startswith(wanted)]
+
+
+async def main(args):
+    async with httpx.AsyncClient(timeout=600) as client:
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(i)
+        latencies = []
+        stop = asyncio.Event()
+
+        before = await scrape(client, args.url)
+        embedders = [
+            asyncio.create_task(embedding_worker(client, args.url, stop)) for _ in range(args.embeddings)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            generation_worker(client, args.url, args.model, queue, latencies)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*embedders)
+        after = await scrape(client, args.url)
+
+        prefill, _ = await throughput(client, args, PARAGRAPH * args.prefill_repeat, 1)
+        _, decode = await throughput(client, args, PROMPT, args.decode_tokens)
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.embeddings} embedding streams")
+    print(f"wall {elapsed:.1f}s  mean {statistics.mean(latencies):.2f}s  "
+          f"p50 {percentile(latencies, 0.5):.2f}s  p99 {percentile(latencies, 0.99):.2f}s")
+    print(f"prefill {prefill:.1f} tok/s  decode {decode:.1f} tok/s (aggregate)")
+    print("metrics before:", *before, sep="\n  ")
+    print("metrics after:", *after, sep="\n  ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--model", default="mamay-gemma-3-12b")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--embeddings", type=int, default=2)
+    parser.add_argument("--prefill-repeat", type=int, default=40, help="paragraphs in each prefill prompt")
+    parser.add_argument("--decode-tokens", type=int, default=128)
+    asyncio.run(main(parser.parse_args()))
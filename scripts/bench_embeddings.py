@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Compare embedding latency: embeddings service over HTTP vs in-process worker.
+
+Drives both backends from app.core.embeddings directly, so the numbers are
+what embedContent adds on top of request parsing. The HTTP mode needs the
+embeddings service running; the in-process mode needs sentence-transformers
+installed locally (backend/requirements-embeddings.txt). When both modes
+run, the last lines compare them per concurrency level.
+
+No reference results are recorded yet: both modes need the real
+sentence-transformers model, which has not been benchmarked on the
+deployment hardware.
+
+Usage:
+    python scripts/bench_embeddings.py [--modes http,inprocess] [--requests 500]
+        [--concurrency 1,8] [--chars 300] [--host localhost] [--port 8001] [--threads 4]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.core.config import settings  # noqa: E402
+from app.core.embeddings import HttpEmbeddings, InProcessEmbeddings  # noqa: E402
+
+TEXT = "Київ — столиця України, одне з найстаріших міст Східної Європи. "
+
+
+async def bench(backend, n_requests, concurrency, text):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await backend.embed(text)
+            latencies.append(time.perf_counter() - start)
+
+    # Warm up (first forward pass, connection setup)
+    for _ in range(5):
+        await backend.embed(text)
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "rps": n_requests / wall,
+    }
+
+
+async def main(args):
+    text = (TEXT * (args.chars // len(TEXT) + 1))[:args.chars]
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    print(f"{args.requests} requests of {len(text)} chars")
+    print(f"{'mode':<10} {'conc':>4} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+
+    results = {}
+    for mode in args.modes.split(","):
+        if mode == "http":
+            backend = HttpEmbeddings(args.host, args.port)
+        else:
+            backend = InProcessEmbeddings(settings.embeddings_model, settings.embeddings_dimensions, args.threads)
+        await backend.start()
+        try:
+            while not backend.is_ready():
+                if getattr(backend, "error", None):
+                    raise RuntimeError(backend.error)
+                await asyncio.sleep(0.1)
+            for concurrency in concurrencies:
+                result = await bench(backend, args.requests, concurrency, text)
+                results[mode, concurrency] = result
+                print(
+                    f"{mode:<10} {concurrency:>4} {result['p50']:8.2f} {result['p95']:8.2f} {result['rps']:8.1f}"
+                )
+        finally:
+            await backend.shutdown()
+
+    for concurrency in concurrencies:
+        http, inprocess = results.get(("http", concurrency)), results.get(("inprocess", concurrency))
+        if http and inprocess:
+            print(
+                f"concurrency {concurrency}: inprocess p50 {inprocess['p50'] - http['p50']:+.2f} ms, "
+                f"throughput x{inprocess['rps'] / http['rps']:.2f} vs http"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="http,inprocess")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", default="1,8")
+    parser.add_argument("--chars", type=int, default=300)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--threads", type=int, default=4, help="torch threads of the in-process worker")
+    asyncio.run(main(parser.parse_args()))
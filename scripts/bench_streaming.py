@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark CPU cost per streamed token: legacy path vs coalesced path.
+
+Runs entirely in-process with a synthetic decode thread (no model needed), so
+it isolates the handoff and SSE serialization overhead around llama.cpp.
+
+Usage:
+    python scripts/bench_streaming.py [--streams 8] [--tokens 2000] [--token-interval-ms 1]
+        [--flush-tokens 4] [--flush-interval-ms 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.api import sse  # noqa: E402
+from app.core.streaming import TokenChannel  # noqa: E402
+
+# Ukrainian text, split into token-sized pieces
+PIECES = ["При", "віт", "!", " Як", " спра", "ви", "?", " Ки", "їв", " —", " сто", "лиця", " Укр", "аї", "ни", "."]
+
+
+def legacy_producer(loop, queue, n_tokens, interval):
+    for i in range(n_tokens):
+        time.sleep(interval)
+        asyncio.run_coroutine_threadsafe(queue.put(PIECES[i % len(PIECES)]), loop)
+    asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+
+
+async def legacy_stream(n_tokens, interval):
+    loop = asyncio.get_event_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    threading.Thread(target=legacy_producer, args=(loop, queue, n_tokens, interval)).start()
+    sent = 0
+    while True:
+        text = await queue.get()
+        if text is None:
+            break
+        chunk = {
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": None,
+                    "index": 0,
+                }
+            ],
+        }
+        sent += len(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+    return sent
+
+
+async def coalesced_stream(n_tokens, interval, flush_tokens, flush_interval):
+    loop = asyncio.get_event_loop()
+    channel = TokenChannel(loop, flush_tokens=flush_tokens, flush_interval=flush_interval)
+
+    def producer():
+        for i in range(n_tokens):
+            time.sleep(interval)
+            channel.put(PIECES[i % len(PIECES)])
+        channel.finish(0, "STOP")
+        channel.close()
+
+    threading.Thread(target=producer).start()
+    sent = 0
+    async for chunk in channel:
+        sent += len(sse.text_chunk(chunk.text, chunk.finish_reason))
+    return sent
+
+
+def run(name, make_stream, streams, n_tokens):
+    async def main():
+        return await asyncio.gather(*(make_stream() for _ in range(streams)))
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    sizes = asyncio.run(main())
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    total = streams * n_tokens
+    print(
+        f"{name:<10} {cpu / total * 1e6:8.2f} us CPU/token  {wall:6.2f}s wall  "
+        f"{sum(sizes) / total:6.1f} bytes/token"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--token-interval-ms", type=float, default=1, help="simulated decode time per token")
+    parser.add_argument("--flush-tokens", type=int, default=4)
+    parser.add_argument("--flush-interval-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.streams} concurrent streams x {args.tokens} tokens")
+    interval = args.token_interval_ms / 1000
+    run("legacy", lambda: legacy_stream(args.tokens, interval), args.streams, args.tokens)
+    run(
+        "coalesced",
+        lambda: coalesced_stream(args.tokens, interval, args.flush_tokens, args.flush_interval_ms / 1000),
+        args.streams,
+        args.tokens,
+    )
@@ -1,57 +1,55 @@
 #!/usr/bin/env python3
-"""Download model using huggingface_hub."""
+"""Download the model GGUF from Hugging Face (or an HF_ENDPOINT mirror).
+
+Uses scripts/downloader.py: parallel Range requests, resume after
+interruption and SHA256 verification against the hash published by the hub.
+"""
 import os
-from huggingface_hub import hf_hub_download
+import sys
+
+from downloader import DownloadError, download, hf_url
 
 # Configuration
 repo_id = "INSAIT-Institute/MamayLM-Gemma-3-12B-IT-v1.0-GGUF"
-filename = "MamayLM-Gemma-3-12B-IT-v1.0.Q5_K_S.gguf"
+filename = "MamayLM-Gemma-3-12B-IT-v1.0.Q5_K_M.gguf"
 local_dir = "backend/models"
-local_filename = "mamay-gemma-3-12b-q5_k_s.gguf"
+# Must match MODEL_PATH in backend/app/core/config.py
+local_filename = "mamay-gemma-3-12b-q5_k_m.gguf"
+
+url = hf_url(repo_id, filename)
+target_path = os.path.join(local_dir, local_filename)
 
 print("=" * 50)
 print("Downloading MamayLM-Gemma-3-12B model...")
 print("=" * 50)
 print(f"Repository: {repo_id}")
 print(f"File: {filename}")
-print(f"Size: ~8.23 GB")
+print(f"URL: {url}")
+print(f"Size: ~8.5 GB")
 print()
 
-# Create directory if it doesn't exist
-os.makedirs(local_dir, exist_ok=True)
-
 try:
-    # Download with progress
-    downloaded_path = hf_hub_download(
-        repo_id=repo_id,
-        filename=filename,
-        local_dir=local_dir,
-        local_dir_use_symlinks=False
-    )
-
-    # Rename to simpler name
-    target_path = os.path.join(local_dir, local_filename)
-    if downloaded_path != target_path and os.path.exists(downloaded_path):
-        os.rename(downloaded_path, target_path)
-        final_path = target_path
-    else:
-        final_path = downloaded_path
+    digest = download(url, target_path)
 
     # Get file size
-    size_bytes = os.path.getsize(final_path)
+    size_bytes = os.path.getsize(target_path)
     size_gb = size_bytes / (1024**3)
 
     print()
     print("=" * 50)
     print("Download complete!")
     print("=" * 50)
-    print(f"Location: {final_path}")
+    print(f"Location: {target_path}")
     print(f"Size: {size_gb:.2f} GB")
+    print(f"SHA256: {digest}")
     print()
     print("You can now run: docker compose up --build")
 
-except Exception as e:
+except KeyboardInterrupt:
+    print("\nInterrupted; run the script again to resume the download")
+    sys.exit(130)
+except DownloadError as e:
     print(f"Error downloading model: {e}")
-    print("\nAlternative: Download manually from:")
+    print("\nRun the script again to resume, or download manually from:")
     print(f"https://huggingface.co/{repo_id}/blob/main/{filename}")
-    exit(1)
+    sys.exit(1)
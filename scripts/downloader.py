@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Resumable, parallel, checksum-verified file downloader (standard library only).
+
+The file is split into fixed-size chunks fetched with HTTP Range requests over
+several connections and written in place into ``<dest>.part``. Finished chunks
+are recorded in a sidecar state file ``<dest>.part.json``, so an interrupted
+download resumes where it stopped instead of starting from zero. SHA256 is
+computed while downloading over the contiguous prefix of finished chunks and
+checked before the file is moved to ``dest``.
+
+The expected hash comes from ``--sha256``, Hugging Face's ``X-Linked-Etag``
+header (the LFS sha256) or a sha256-looking ETag. Servers without Range
+support (e.g. ``python -m http.server``) fall back to a single stream.
+
+Usage:
+    python scripts/downloader.py URL DEST [--connections 8] [--chunk-mb 64] [--sha256 HEX]
+
+Hugging Face URLs honour HF_ENDPOINT (mirror) and HF_TOKEN, like huggingface_hub.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+HF_ENDPOINT = os.environ.get("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+USER_AGENT = "ai-ua-downloader/1.0"
+READ_SIZE = 1024 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed."""
+
+
+class ChecksumError(DownloadError):
+    """Raised when the downloaded file does not match the expected SHA256."""
+
+
+@dataclass
+class RemoteFile:
+    """What the server told us about the file."""
+    url: str
+    size: Optional[int]
+    sha256: Optional[str]
+    accept_ranges: bool
+    # Bearer token for requests to ``url``; None once a redirect left the
+    # origin the token was given for
+    token: Optional[str] = None
+
+
+def hf_url(repo_id: str, filename: str, revision: str = "main") -> str:
+    """Download URL of a file in a Hugging Face repo (or HF_ENDPOINT mirror)."""
+    return f"{HF_ENDPOINT}/{repo_id}/resolve/{revision}/{filename}"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _request(url: str, token: Optional[str], method: str = "GET", headers: Optional[Dict[str, str]] = None):
+    request = urllib.request.Request(url, method=method, headers={"User-Agent": USER_AGENT, **(headers or {})})
+    if token:
+        # Unredirected: urllib would otherwise copy it to any redirect target
+        request.add_unredirected_header("Authorization", f"Bearer {token}")
+    return request
+
+
+def _etag_sha256(etag: Optional[str]) -> Optional[str]:
+    if not etag:
+        return None
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    etag = etag.strip('"').lower()
+    return etag if SHA256_RE.match(etag) else None
+
+
+def resolve(url: str, token: Optional[str] = None, timeout: float = 30) -> RemoteFile:
+    """Follow redirects with HEAD requests and collect size, hash and range support.
+
+    Hugging Face answers ``resolve`` URLs with a redirect to its CDN whose
+    headers carry the LFS sha256 (``X-Linked-Etag``) and size; the CDN itself
+    only returns an opaque ETag, so the headers are read hop by hop. The
+    token is dropped at the first redirect to another origin and the
+    returned ``RemoteFile.token`` is what downloads must send.
+    """
+    opener = urllib.request.build_opener(_NoRedirect)
+    origin = urllib.parse.urlparse(url).netloc
+    sha256 = None
+    size = None
+    for _ in range(10):
+        try:
+            response = opener.open(_request(url, token, method="HEAD"), timeout=timeout)
+            headers, status = response.headers, response.status
+            response.close()
+        except urllib.error.HTTPError as e:
+            if e.code not in (301, 302, 303, 307, 308):
+                raise DownloadError(f"HEAD {url} failed: HTTP {e.code}") from e
+            headers, status = e.headers, e.code
+
+        sha256 = sha256 or _etag_sha256(headers.get("X-Linked-Etag"))
+        if headers.get("X-Linked-Size"):
+            size = size or int(headers["X-Linked-Size"])
+
+        if status in (301, 302, 303, 307, 308):
+            url = urllib.parse.urljoin(url, headers["Location"])
+            # Do not leak the token to third-party CDNs
+            if urllib.parse.urlparse(url).netloc != origin:
+                token = None
+            continue
+
+        length = headers.get("Content-Length")
+        return RemoteFile(
+            url=url,
+            size=int(length) if length else size,
+            sha256=sha256 or _etag_sha256(headers.get("ETag")),
+            accept_ranges=headers.get("Accept-Ranges", "").lower() == "bytes",
+            token=token,
+        )
+    raise DownloadError(f"Too many redirects for {url}")
+
+
+class _State:
+    """Sidecar state file recording finished chunks."""
+
+    def __init__(self, path: str, remote: RemoteFile, chunk_size: int):
+        self.path = path
+        self.key = {"size": remote.size, "sha256": remote.sha256, "chunk_size": chunk_size}
+        self.done: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Load finished chunks if the state matches this download."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if any(data.get(k) != v for k, v in self.key.items()):
+            return False
+        self.done = set(data.get("done", []))
+        return True
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({**self.key, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _PrefixHasher:
+    """Hashes the file in order as contiguous chunks complete.
+
+    Chunks finish out of order; each one is hashed (read back from the page
+    cache) as soon as every chunk before it is done, so verification runs
+    alongside the download and only the tail is left at the end.
+    """
+
+    def __init__(self, part_path: str, chunk_size: int, size: int):
+        self.part_path = part_path
+        self.chunk_size = chunk_size
+        self.size = size
+        self.next_index = 0
+        self._sha = hashlib.sha256()
+        self._done: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def chunk_done(self, index: int):
+        with self._lock:
+            self._done.add(index)
+            with open(self.part_path, "rb") as f:
+                while self.next_index in self._done:
+                    start = self.next_index * self.chunk_size
+                    end = min(start + self.chunk_size, self.size)
+                    f.seek(start)
+                    while start < end:
+                        data = f.read(min(READ_SIZE, end - start))
+                        if not data:
+                            raise DownloadError("Part file is shorter than expected")
+                        self._sha.update(data)
+                        start += len(data)
+                    self._done.discard(self.next_index)
+                    self.next_index += 1
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+class _Progress:
+    def __init__(self, total: Optional[int], done: int = 0, quiet: bool = False):
+        self.total = total
+        self.done = done
+        self.quiet = quiet
+        self._start = time.monotonic()
+        self._start_done = done
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, n: int):
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            if not self.quiet and now - self._last >= 1:
+                self._last = now
+                self._print(now)
+
+    def _print(self, now: float, end: str = "\r"):
+        speed = (self.done - self._start_done) / max(now - self._start, 1e-6) / 1024 ** 2
+        if self.total:
+            line = f"{self.done / 1024 ** 3:.2f}/{self.total / 1024 ** 3:.2f} GB ({self.done * 100 / self.total:.1f}%)"
+        else:
+            line = f"{self.done / 1024 ** 3:.2f} GB"
+        print(f"  {line}  {speed:.1f} MB/s   ", end=end, file=sys.stderr, flush=True)
+
+    def close(self):
+        if not self.quiet:
+            self._print(time.monotonic(), end="\n")
+
+
+def _fetch_chunk(remote: RemoteFile, part_path: str, start: int, end: int,
+                 progress: _Progress, retries: int, timeout: float):
+    """Fetch bytes [start, end) into the part file, retrying with backoff."""
+    for attempt in range(retries + 1):
+        written = 0
+        try:
+            request = _request(remote.url, remote.token, headers={"Range": f"bytes={start}-{end - 1}"})
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if response.status != 206:
+                    raise DownloadError(f"Server ignored Range request (HTTP {response.status})")
+                fd = os.open(part_path, os.O_WRONLY)
+                try:
+                    while start + written < end:
+                        data = response.read(min(READ_SIZE, end - start - written))
+                        if not data:
+                            raise DownloadError("Connection closed mid-chunk")
+                        os.pwrite(fd, data, start + written)
+                        written += len(data)
+                        progress.add(len(data))
+                finally:
+                    os.close(fd)
+            return
+        except (OSError, http.client.HTTPException, DownloadError) as e:
+            # HTTPException covers IncompleteRead from a connection dropped mid-chunk
+            progress.add(-written)
+            if attempt == retries:
+                raise DownloadError(f"Chunk at {start} failed after {retries} retries: {e}") from e
+            time.sleep(min(2 ** attempt, 30))
+
+
+def _download_ranges(remote: RemoteFile, part_path: str, state_path: str,
+                     connections: int, chunk_size: int, retries: int, timeout: float, quiet: bool) -> str:
+    size = remote.size
+    n_chunks = (size + chunk_size - 1) // chunk_size
+    state = _State(state_path, remote, chunk_size)
+    if not (os.path.exists(part_path) and state.load()):
+        state.done = set()
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+
+    def chunk_bytes(index: int) -> int:
+        return min(chunk_size, size - index * chunk_size)
+
+    hasher = _PrefixHasher(part_path, chunk_size, size)
+    for index in sorted(state.done):
+        hasher.chunk_done(index)
+    progress = _Progress(size, sum(chunk_bytes(i) for i in state.done), quiet)
+    if state.done and not quiet:
+        print(f"Resuming: {len(state.done)}/{n_chunks} chunks already downloaded", file=sys.stderr)
+
+    pending = [i for i in range(n_chunks) if i not in state.done]
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        futures = {
+            pool.submit(
+                _fetch_chunk, remote, part_path, i * chunk_size, i * chunk_size + chunk_bytes(i),
+                progress, retries, timeout,
+            ): i
+            for i in pending
+        }
+        try:
+            for future in as_completed(futures):
+                future.result()
+                index = futures[future]
+                state.mark_done(index)
+                hasher.chunk_done(index)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            progress.close()
+
+    return hasher.hexdigest()
+
+
+def _download_stream(remote: RemoteFile, part_path: str, timeout: float, quiet: bool) -> str:
+    """Single-connection fallback for servers without Range support."""
+    sha = hashlib.sha256()
+    progress = _Progress(remote.size, 0, quiet)
+    with urllib.request.urlopen(_request(remote.url, remote.token), timeout=timeout) as response, open(part_path, "wb") as f:
+        while True:
+            data = response.read(READ_SIZE)
+            if not data:
+                break
+            f.write(data)
+            sha.update(data)
+            progress.add(len(data))
+    progress.close()
+    if remote.size is not None and progress.done != remote.size:
+        raise DownloadError(f"Expected {remote.size} bytes, got {progress.done}")
+    return sha.hexdigest()
+
+
+def download(
+    url: str,
+    dest: str,
+    sha256: Optional[str] = None,
+    token: Optional[str] = None,
+    connections: int = 8,
+    chunk_size: int = 64 * 1024 * 1024,
+    retries: int = 5,
+    timeout: float = 60,
+    quiet: bool = False,
+) -> str:
+    """Download ``url`` to ``dest``, resuming and verifying SHA256.
+
+    Args:
+        url: HTTP(S) URL (Hugging Face ``resolve`` URL, mirror or file server)
+        dest: Target path; written only after verification succeeds
+        sha256: Expected hex digest; defaults to the one advertised by the server
+        token: Bearer token (defaults to HF_TOKEN)
+        connections: Concurrent Range connections
+        chunk_size: Bytes per Range request (and resume granularity)
+        retries: Retries per chunk
+        timeout: Socket timeout in seconds
+
+    Returns:
+        SHA256 hex digest of the downloaded file
+
+    Raises:
+        DownloadError: On network or server errors
+        ChecksumError: If the file does not match the expected hash
+    """
+    remote = resolve(url, token or os.environ.get("HF_TOKEN"), timeout)
+    expected = (sha256 or remote.sha256 or "").lower() or None
+    remote.sha256 = expected
+
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part_path = dest + ".part"
+    state_path = part_path + ".json"
+
+    if remote.accept_ranges and remote.size:
+        digest = _download_ranges(
+            remote, part_path, state_path, connections, chunk_size, retries, timeout, quiet
+        )
+    else:
+        if not quiet:
+            print("Server does not support Range requests; downloading in one stream", file=sys.stderr)
+        digest = _download_stream(remote, part_path, timeout, quiet)
+
+    if expected is None:
+        if not quiet:
+            print(f"Warning: no expected SHA256 available, not verified ({digest})", file=sys.stderr)
+    elif digest != expected:
+        # Corrupt data cannot be resumed from; start over next time
+        os.remove(part_path)
+        _State(state_path, remote, chunk_size).remove()
+        raise ChecksumError(f"SHA256 mismatch: expected {expected}, got {digest}")
+
+    os.replace(part_path, dest)
+    _State(state_path, remote, chunk_size).remove()
+    return digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url", help="File URL (Hugging Face resolve URL, mirror or file server)")
+    parser.add_argument("dest", help="Destination path")
+    parser.add_argument("--sha256", help="Expected SHA256 (default: advertised by the server)")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--chunk-mb", type=int, default=64)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        digest = download(
+            args.url, args.dest, sha256=args.sha256, connections=args.connections,
+            chunk_size=args.chunk_mb * 1024 * 1024, retries=args.retries, quiet=args.quiet,
+        )
+    except DownloadError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume", file=sys.stderr)
+        sys.exit(130)
+    print(f"{digest}  {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
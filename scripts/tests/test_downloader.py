@@ -0,0 +1,222 @@
+"""Tests for scripts/downloader.py against a local Range-capable HTTP server."""
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Set
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import downloader  # noqa: E402
+
+PAYLOAD = os.urandom(100_000)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+CHUNK = 16 * 1024  # 7 chunks
+
+
+class FileServer:
+    """Serves PAYLOAD at /file, optionally with Range support and redirects.
+
+    Every request is recorded as (method, path, Range, Authorization).
+    """
+
+    def __init__(self, ranges: bool = True):
+        self.ranges = ranges
+        self.redirects: Dict[str, str] = {}
+        # Range starts that fail once, mid-body
+        self.fail_once: Set[int] = set()
+        self.requests: List[tuple] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(body=False)
+
+            def do_GET(self):
+                self._serve(body=True)
+
+            def _serve(self, body: bool):
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.requests.append(
+                        (self.command, self.path, range_header, self.headers.get("Authorization"))
+                    )
+                if self.path in server.redirects:
+                    self.send_response(302)
+                    self.send_header("Location", server.redirects[self.path])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                start, end = 0, len(PAYLOAD)
+                if server.ranges and range_header and body:
+                    first, _, last = range_header.removeprefix("bytes=").partition("-")
+                    start, end = int(first), int(last) + 1
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(PAYLOAD)}")
+                else:
+                    self.send_response(200)
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start))
+                self.end_headers()
+                if not body:
+                    return
+
+                data = PAYLOAD[start:end]
+                with server._lock:
+                    fail = start in server.fail_once
+                    server.fail_once.discard(start)
+                if fail:
+                    self.wfile.write(data[:len(data) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def origin(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str = "/file") -> str:
+        return self.origin + path
+
+    def gets(self) -> List[tuple]:
+        return [r for r in self.requests if r[0] == "GET"]
+
+
+@pytest.fixture
+def make_server(monkeypatch):
+    monkeypatch.delenv("HF_TOKEN", raising=False)
+    servers = []
+
+    def make(**kwargs) -> FileServer:
+        server = FileServer(**kwargs)
+        server.thread.start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.httpd.shutdown()
+        server.httpd.server_close()
+
+
+def test_parallel_download(make_server, tmp_path):
+    server = make_server()
+    dest = tmp_path / "model.gguf"
+
+    digest = downloader.download(
+        server.url(), str(dest), sha256=SHA256, connections=4, chunk_size=CHUNK, quiet=True
+    )
+
+    assert digest == SHA256
+    assert dest.read_bytes() == PAYLOAD
+    assert not os.path.exists(str(dest) + ".part")
+    assert not os.path.exists(str(dest) + ".part.json")
+    ranges = sorted(r[2] for r in server.gets())
+    assert len(ranges) == 7 and all(r.startswith("bytes=") for r in ranges)
+
+
+def test_resume_after_interrupted_chunk(make_server, tmp_path):
+    server = make_server()
+    server.fail_once.add(2 * CHUNK)
+    dest = tmp_path / "model.gguf"
+
+    # One connection, no retries: chunks 0 and 1 finish, chunk 2 breaks off
+    with pytest.raises(downloader.DownloadError):
+        downloader.download(
+            server.url(), str(dest), sha256=SHA256, connections=1, chunk_size=CHUNK, retries=0, quiet=True
+        )
+    assert not dest.exists()
+    assert os.path.exists(str(dest) + ".part.json")
+
+    server.requests.clear()
+    digest = downloader.download(
+        server.url(), str(dest), sha256=SHA256, connections=1, chunk_size=CHUNK, quiet=True
+    )
+
+    assert digest == SHA256
+    assert dest.read_bytes() == PAYLOAD
+    starts = sorted(int(r[2].removeprefix("bytes=").split("-")[0]) for r in server.gets())
+    assert starts == [i * CHUNK for i in range(2, 7)]
+
+
+def test_interrupted_chunk_is_retried(make_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader.time, "sleep", lambda _: None)
+    server = make_server()
+    server.fail_once.add(3 * CHUNK)
+    dest = tmp_path / "model.gguf"
+
+    assert downloader.download(
+        server.url(), str(dest), sha256=SHA256, connections=4, chunk_size=CHUNK, quiet=True
+    ) == SHA256
+    assert dest.read_bytes() == PAYLOAD
+
+
+def test_sha256_mismatch(make_server, tmp_path):
+    server = make_server()
+    dest = tmp_path / "model.gguf"
+
+    with pytest.raises(downloader.ChecksumError):
+        downloader.download(
+            server.url(), str(dest), sha256="0" * 64, connections=4, chunk_size=CHUNK, quiet=True
+        )
+
+    # Nothing is kept to resume from corrupt data
+    assert not dest.exists()
+    assert not os.path.exists(str(dest) + ".part")
+    assert not os.path.exists(str(dest) + ".part.json")
+
+
+def test_single_stream_without_accept_ranges(make_server, tmp_path):
+    server = make_server(ranges=False)
+    dest = tmp_path / "model.gguf"
+
+    digest = downloader.download(
+        server.url(), str(dest), sha256=SHA256, connections=4, chunk_size=CHUNK, quiet=True
+    )
+
+    assert digest == SHA256
+    assert dest.read_bytes() == PAYLOAD
+    gets = server.gets()
+    assert len(gets) == 1 and gets[0][2] is None
+
+
+def test_token_not_sent_across_redirect(make_server, tmp_path):
+    origin = make_server()
+    cdn = make_server()
+    origin.redirects["/resolve/main/model.gguf"] = cdn.url()
+    dest = tmp_path / "model.gguf"
+
+    downloader.download(
+        origin.url("/resolve/main/model.gguf"), str(dest), sha256=SHA256, token="secret",
+        connections=4, chunk_size=CHUNK, quiet=True,
+    )
+
+    assert dest.read_bytes() == PAYLOAD
+    assert origin.requests[0][3] == "Bearer secret"
+    assert cdn.requests and all(r[3] is None for r in cdn.requests)
+
+
+def test_token_kept_on_same_origin_redirect(make_server, tmp_path):
+    server = make_server()
+    server.redirects["/resolve/main/model.gguf"] = "/file"
+    dest = tmp_path / "model.gguf"
+
+    downloader.download(
+        server.url("/resolve/main/model.gguf"), str(dest), sha256=SHA256, token="secret",
+        connections=4, chunk_size=CHUNK, quiet=True,
+    )
+
+    assert all(r[3] == "Bearer secret" for r in server.requests)